@@ -0,0 +1,283 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+asyncio counterparts of the streaming I/O in uf2utils.stream, over
+asyncio.StreamReader/StreamWriter, so UF2s can be received and served
+without blocking the event loop or holding whole images in memory.
+
+Blocks are decoded as data arrives and encoded in batches, each batch
+followed by an await of writer.drain() so a slow client applies
+backpressure rather than filling up memory.
+
+    async def receive(reader, writer):
+        async for blk in aiter_blocks(reader):  # UF2DecodeError if invalid
+            print(blk.header.address)
+
+    async def serve(reader, writer):
+        uf2 = personalized_uf2_for(reader)
+        await write_uf2(uf2, writer)
+
+    async def serve_binary(writer, path, hdr):
+        size = os.path.getsize(path)
+        async with AsyncUF2StreamWriter(writer, hdr, num_blocks_for(size)) as out:
+            with open(path, 'rb') as f:
+                # file reads happen on the default executor
+                await out.write_payload(f, 0x10000000)
+
+'''
+import asyncio
+from uf2utils.constants import BlockSize, DefaultBlockPayloadSize, MaxPayloadSize, Magic
+from uf2utils.header import Header, UF2EncodeError, UF2DecodeError
+from uf2utils.block import DataBlock
+from uf2utils.file import UF2File
+from uf2utils.stream import UF2StreamWriter, StreamReadSize, StreamBatchBlocks, iter_chunks
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def num_blocks_for(payload_size:int, block_payload_size:int=DefaultBlockPayloadSize) -> int:
+    '''
+        Number of blocks write_payload() produces for payload_size bytes,
+        the total_blocks to announce when streaming to a socket.
+    '''
+    return -(-payload_size // block_payload_size)
+
+
+async def aiter_records(reader:asyncio.StreamReader, read_size:int=StreamReadSize):
+    '''
+        Yield the raw 512 byte records from an asyncio.StreamReader, as
+        they arrive.  Records are memoryview slices of the data read.
+
+        @raise UF2DecodeError: if the stream ends mid-record
+    '''
+    leftover = b''
+    while True:
+        chunk = await reader.read(read_size)
+        if not chunk:
+            break
+        if len(leftover):
+            chunk = leftover + chunk
+
+        num_full = len(chunk) - (len(chunk) % BlockSize)
+        view = memoryview(chunk)
+        for i in range(0, num_full, BlockSize):
+            yield view[i:i + BlockSize]
+        leftover = bytes(view[num_full:])
+
+    if len(leftover):
+        raise UF2DecodeError(f'Stream ended with a partial block of {len(leftover)} bytes')
+
+
+async def aiter_blocks(reader:asyncio.StreamReader, read_size:int=StreamReadSize,
+                       magic:Magic=None):
+    '''
+        Async generator of DataBlocks, decoded one at a time as the
+        data comes in.
+
+        @param magic: the stream's magic values, if not the standard ones
+        @raise UF2DecodeError: on the first invalid block
+    '''
+    async for record in aiter_records(reader, read_size):
+        yield DataBlock.fromBlock(record, magic=magic)
+
+
+async def read_blocks(reader:asyncio.StreamReader, magic:Magic=None) -> list:
+    '''
+        Read all blocks from reader (async UF2File.readBlocks()).
+    '''
+    blocks = []
+    async for record in aiter_records(reader):
+        blocks.append(DataBlock.fromBlock(bytes(record), len(blocks), magic))
+    return blocks
+
+
+async def aiter_chunks(source, chunk_size:int):
+    '''
+        Async version of stream.iter_chunks(): source may also be an
+        asyncio.StreamReader or an async iterable of bytes-like chunks.
+
+        Regular (blocking) file objects are read on the loop's default
+        executor, so the event loop keeps running meanwhile.  Plain
+        iterables are consumed directly and shouldn't block.
+    '''
+    if hasattr(source, 'readexactly'):
+        while True:
+            try:
+                yield await source.readexactly(chunk_size)
+            except asyncio.IncompleteReadError as e:
+                if len(e.partial):
+                    yield e.partial
+                return
+
+    if hasattr(source, 'read') and not hasattr(source, '__aiter__'):
+        loop = asyncio.get_running_loop()
+        chunks = iter_chunks(source, chunk_size)
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    if not hasattr(source, '__aiter__'):
+        for chunk in iter_chunks(source, chunk_size):
+            yield chunk
+        return
+
+    pending = bytearray()
+    async for chunk in source:
+        pending += chunk
+        if len(pending) < chunk_size:
+            continue
+        view = memoryview(pending)
+        num_full = len(pending) - (len(pending) % chunk_size)
+        for i in range(0, num_full, chunk_size):
+            yield bytes(view[i:i + chunk_size])
+        view.release()
+        del pending[:num_full]
+
+    if len(pending):
+        yield pending
+
+
+class _TransportOutput:
+    '''
+        Minimal file-like front for an asyncio.StreamWriter, noting
+        when a drain() is due.
+    '''
+    def __init__(self, writer:asyncio.StreamWriter):
+        self.writer = writer
+        self.needs_drain = False
+
+    def write(self, data):
+        # transports may hang on to what they're given
+        self.writer.write(bytes(data))
+        self.needs_drain = True
+
+    def flush(self):
+        pass
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return 0
+
+
+class AsyncUF2StreamWriter:
+    '''
+        Writes UF2 blocks to an asyncio.StreamWriter as payload comes in,
+        awaiting drain() after every batch of blocks.
+
+        A stream can't be patched after the fact, so total_blocks must be
+        known up front (see num_blocks_for()).  The StreamWriter is left
+        open on close().
+
+        @see: stream.UF2StreamWriter, which this drives
+    '''
+    def __init__(self, writer:asyncio.StreamWriter, header:Header, total_blocks:int,
+                 magic_start1:int=None, magic_end:int=None, magic:Magic=None):
+        self._out = _TransportOutput(writer)
+        self._encoder = UF2StreamWriter(self._out, header, total_blocks,
+                                        magic_start1, magic_end, magic)
+
+    @property
+    def num_blocks(self):
+        return self._encoder.num_blocks
+
+    @property
+    def total_blocks(self):
+        return self._encoder.total_blocks
+
+    async def write_payload(self, source, start_offset:int,
+                            block_payload_size:int=DefaultBlockPayloadSize) -> int:
+        '''
+            Write arbitrary payload, in blocks of block_payload_size,
+            starting at address start_offset.
+
+            @param source: as for aiter_chunks()
+            @return: number of payload bytes written
+        '''
+        if block_payload_size <= 0 or block_payload_size > MaxPayloadSize:
+            raise UF2EncodeError(f'Block payload size must be between 1 and {MaxPayloadSize}')
+
+        address = start_offset
+        async for chunk in aiter_chunks(source, block_payload_size):
+            await self.write_block(address, chunk)
+            address += len(chunk)
+
+        return address - start_offset
+
+    async def write_datablock(self, dblock:DataBlock):
+        '''
+            @see: UF2StreamWriter.write_datablock()
+        '''
+        self._encoder.write_datablock(dblock)
+        await self._drain()
+
+    async def write_block(self, address:int, payload, flags:int=None, board_family:int=None,
+                          md5:tuple=None, tags:bytes=None, file_name:bytes=None):
+        '''
+            @see: UF2StreamWriter.write_block()
+        '''
+        self._encoder.write_block(address, payload, flags, board_family, md5, tags, file_name)
+        await self._drain()
+
+    async def flush(self):
+        self._encoder.flush()
+        await self._drain()
+
+    async def close(self):
+        '''
+            Flush everything out.
+
+            @raise UF2EncodeError: if the number of blocks written isn't
+            the total_blocks announced
+        '''
+        self._encoder.close()
+        await self._drain()
+
+    async def _drain(self):
+        if self._out.needs_drain:
+            self._out.needs_drain = False
+            await self._out.writer.drain()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            await self.close()
+
+    def __repr__(self):
+        return f'<AsyncUF2StreamWriter {self.num_blocks} blocks>'
+
+
+async def write_uf2(uf2:UF2File, writer:asyncio.StreamWriter):
+    '''
+        Encode uf2 onto writer (async UF2File.to_file()), batch by batch,
+        waiting on drain() between batches.
+
+        @return: number of blocks written
+    '''
+    uf2.finalize()
+    batch = bytearray(StreamBatchBlocks * BlockSize)
+    batch_count = 0
+    num_written = 0
+    for blk in uf2.iter_output_blocks():
+        blk.pack_into(batch, batch_count * BlockSize)
+        batch_count += 1
+        if batch_count == StreamBatchBlocks:
+            writer.write(bytes(batch))
+            num_written += batch_count
+            batch_count = 0
+            await writer.drain()
+
+    if batch_count:
+        writer.write(bytes(batch[:batch_count * BlockSize]))
+        num_written += batch_count
+        await writer.drain()
+    return num_written
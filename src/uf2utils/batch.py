@@ -0,0 +1,242 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+Running an operation over many UF2 files at once.
+
+Each file is handled independently, on a thread or process pool, and
+results come back as files complete.  A file that fails only affects
+its own result.
+
+    for res in run_batch('info', paths, max_workers=8):
+        if res.ok:
+            print(res.path, res.value['num_blocks'])
+        else:
+            print(f'{res.path} failed: {res.error}')
+
+Operations are info, extract, validate and reencode (see the functions
+of those names) or any picklable function taking a path as its first
+argument.  Keyword arguments given to run_batch() are passed along.
+'''
+import concurrent.futures
+import os
+from uf2utils.constants import Flags, Magic
+from uf2utils.file import UF2File
+from uf2utils.checksum import verify_checksums
+from uf2utils.vectorized import validate_file
+
+import logging
+log = logging.getLogger(__name__)
+
+# futures in flight, per worker, so huge batches aren't all queued up front
+PendingPerWorker = 4
+
+
+class BatchResult:
+    '''
+        Outcome of an operation on one file: value, if all went well,
+        or the exception raised.
+    '''
+    def __init__(self, path:str, value=None, error:Exception=None):
+        self.path = path
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return f'<BatchResult {self.path} OK>'
+        return f'<BatchResult {self.path} FAILED: {self.error}>'
+
+
+def _num_gap_blocks(spans) -> int:
+    '''
+        Padding blocks needed between sorted (address, size) spans,
+        counted as UF2File.find_gaps() would.
+    '''
+    num_pad = 0
+    for (address, size), (next_address, _next_size) in zip(spans, spans[1:]):
+        gap = next_address - (address + size)
+        if gap > 0 and size:
+            num_pad += -(-gap // size)
+    return num_pad
+
+
+def info(path:str) -> dict:
+    '''
+        Summary of a UF2 (block count, span, families, flags, tags...),
+        from its headers.
+    '''
+    uf2 = UF2File(path, fill_gaps=False, lazy=True, use_mmap=True)
+    hdrs = uf2.header_index
+    summary = {
+        'path': path,
+        'num_blocks': len(uf2),
+        'payload_size': sum(hdrs.payload_size),
+        'start': min(hdrs.address) if len(uf2) else None,
+        'end': max(hdrs.address) if len(uf2) else None,
+        'all_have_family': None not in uf2.family_index,
+        'families': dict((fam, len(records)) for fam, records in uf2.family_index.items()),
+        'flags': dict(),
+        'num_gap_blocks': 0,
+    }
+    for records in uf2.family_index.values():
+        summary['num_gap_blocks'] += _num_gap_blocks(sorted(
+                            (hdrs.address[idx], hdrs.payload_size[idx]) for idx in records))
+    for flags in hdrs.flags:
+        summary['flags'][flags] = summary['flags'].get(flags, 0) + 1
+
+    tag_index = uf2.tag_index
+    summary['tags'] = dict((tag_type, tag_index.first(tag_type)) for tag_type in tag_index.types)
+
+    summary['num_checksummed'] = sum(v for k, v in summary['flags'].items()
+                                     if k & Flags.MD5ChecksumPresent)
+    summary['checksum_failures'] = verify_checksums(uf2) if summary['num_checksummed'] else []
+    return summary
+
+
+def extract(path:str, out_path:str=None, offset_start:int=0, offset_end:int=None,
+            fill_gaps:bool=False) -> str:
+    '''
+        Write the (address sorted) payload of a UF2 to out_path
+        (defaults to path, with a .bin extension).
+
+        @return: path of the output
+    '''
+    if out_path is None:
+        out_path = os.path.splitext(path)[0] + '.bin'
+    uf2 = UF2File(path, use_mmap=True)
+    uf2.sort_blocks()
+    if fill_gaps:
+        uf2.generate_blocks_for_gaps()
+
+    bts = uf2.extract_payload(offset_start, offset_end)
+    with open(out_path, 'wb') as outfile:
+        outfile.write(bts)
+    return out_path
+
+
+def validate(path:str, magic_start1:int=None, magic_end:int=None) -> dict:
+    '''
+        Check the magic numbers, block numbering and any checksums of a UF2.
+
+        @return: dict of the problems found, by type (empty lists if none)
+    '''
+    problems = {'bad_magic': validate_file(path, magic_start1, magic_end)}
+    if len(problems['bad_magic']):
+        # the rest would only pile on
+        problems['bad_numbering'] = []
+        problems['checksum_failures'] = []
+        return problems
+
+    uf2 = UF2File(path, lazy=True, use_mmap=True,
+                  magic_start=magic_start1, magic_end=magic_end)
+    hdrs = uf2.header_index
+    # numbered as renumber_blocks() would: per family, when there are several
+    # (family_index only counts flagged family ids, so not container file sizes)
+    per_family = len(uf2.family_index) > 1
+    bad_numbering = []
+    for records in (uf2.family_index.values() if per_family else [range(len(uf2))]):
+        for pos, idx in enumerate(records):
+            if hdrs.block_number[idx] != pos or hdrs.total_blocks[idx] != len(records):
+                bad_numbering.append(idx)
+    problems['bad_numbering'] = sorted(bad_numbering)
+    problems['checksum_failures'] = verify_checksums(uf2)
+    return problems
+
+
+def reencode(path:str, out_path:str, board_family:int=None,
+             magic_start1:int=None, magic_end:int=None, fill_gaps:bool=False) -> str:
+    '''
+        Rewrite a UF2, optionally with a new board family for all blocks,
+        new magic numbers and/or gaps filled.
+
+        @return: path of the output
+    '''
+    uf2 = UF2File(path, use_mmap=True)
+    target = Magic(magic_start1 if magic_start1 is not None else uf2.magic_start1,
+                   magic_end if magic_end is not None else uf2.magic_end)
+    uf2.magic = target
+    for blk in uf2:
+        if board_family is not None:
+            blk.header.board_family = board_family
+            blk.header.flags |= Flags.FamilyIDPresent
+        blk.magic_start1 = target.start1
+        blk.magic_end = target.end
+
+    if board_family is not None:
+        uf2.header.board_family = board_family
+        uf2.header.flags |= Flags.FamilyIDPresent
+    uf2.reindex()
+    if fill_gaps:
+        # a file just read isn't dirty, to_file() alone wouldn't pad it
+        uf2.sort_blocks()
+        uf2.generate_blocks_for_gaps()
+    uf2.renumber_blocks()
+    uf2.to_file(out_path)
+    return out_path
+
+
+Operations = {
+    'info': info,
+    'extract': extract,
+    'validate': validate,
+    'reencode': reencode,
+}
+
+
+def _run(operation, path:str, kwargs:dict) -> BatchResult:
+    try:
+        return BatchResult(path, operation(path, **kwargs))
+    except Exception as e:
+        log.debug(f'{path} failed: {e}')
+        return BatchResult(path, error=e)
+
+
+def run_batch(operation, paths, max_workers:int=None, use_processes:bool=False,
+              per_path:dict=None, **kwargs):
+    '''
+        Apply operation to every path, concurrently.
+
+        @param operation: name (see Operations) or function of (path, **kwargs)
+        @param paths: iterable of paths, consumed as the batch proceeds
+        @param max_workers: pool size (defaults to executor's default)
+        @param use_processes: use a process pool rather than threads
+        @param per_path: optional dict of path: kwargs, merged over kwargs
+        for that path (e.g. individual output paths)
+        @return: generator of BatchResults, in completion order
+    '''
+    if isinstance(operation, str):
+        operation = Operations[operation]
+
+    if max_workers is None:
+        # as the executors would default it
+        num_cpus = os.cpu_count() or 1
+        max_workers = num_cpus if use_processes else min(32, num_cpus + 4)
+
+    if use_processes:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+    else:
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    with pool:
+        max_pending = max_workers * PendingPerWorker
+        pending = set()
+        for path in paths:
+            path_kwargs = kwargs
+            if per_path is not None and path in per_path:
+                path_kwargs = dict(kwargs, **per_path[path])
+            pending.add(pool.submit(_run, operation, path, path_kwargs))
+            if len(pending) >= max_pending:
+                done, pending = concurrent.futures.wait(pending,
+                                    return_when=concurrent.futures.FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+
+        for fut in concurrent.futures.as_completed(pending):
+            yield fut.result()
@@ -5,9 +5,135 @@ Created on Mar 13, 2024
 @copyright: Copyright (C) 2024 Pat Deegan, https://psychogenic.com
 '''
 import struct
-from uf2utils.constants import MaxPayloadSize, BlockSize, Magic
-from uf2utils.header import Header 
+from uf2utils.constants import MaxPayloadSize, BlockSize, Magic, Flags
+from uf2utils.header import Header, UF2EncodeError
+from uf2utils.tags import tags_start, parse_tags, encode_tags, decode_tag, tag_bytes
 
+# with Flags.MD5ChecksumPresent, the last 24 bytes of the data area 
+# hold the (address, length, md5 digest) of a flash region
+MD5Trailer = struct.Struct('<II16s')
+MD5TrailerOffset = 32 + MaxPayloadSize - MD5Trailer.size
+MaxChecksummedPayloadSize = MaxPayloadSize - MD5Trailer.size
+
+# one complete block layout per payload size (and presence of 
+# md5 trailer), the 's' field takes care of zero padding the payload
+_BlockStructs = dict()
+
+def block_struct(payload_size:int, with_md5:bool=False) -> struct.Struct:
+    try:
+        return _BlockStructs[(payload_size, with_md5)]
+    except KeyError:
+        if with_md5:
+            st = struct.Struct(f'<8I{payload_size}s{MaxChecksummedPayloadSize - payload_size}xII16sI')
+        else:
+            st = struct.Struct(f'<8I{payload_size}s{MaxPayloadSize - payload_size}xI')
+        _BlockStructs[(payload_size, with_md5)] = st
+        return st 
+
+def pack_block(target, offset:int, flags:int, address:int, payload, 
+               block_number:int, total_blocks:int, board_family:int,
+               magic_start1:int=None, magic_end:int=None, md5:tuple=None,
+               tags:bytes=None, file_name:bytes=None):
+    '''
+        Encode a complete block into target (a bytearray, mmap or other
+        writable buffer) at offset.  Unused payload space is zeroed.
+        
+        @param md5: optional (address, length, digest) checksum trailer
+        @param tags: optional encoded extension tags (see encode_tags())
+        @param file_name: optional name, for file container blocks 
+    '''
+    if magic_start1 is None:
+        magic_start1 = Magic.START1 
+    if magic_end is None:
+        magic_end = Magic.END
+    if not isinstance(payload, (bytes, bytearray)):
+        # struct only packs these, memoryviews and such need a copy
+        payload = bytes(payload)
+    payload_size = len(payload)
+    if tags is not None:
+        tags_from = tags_start(payload_size)
+        space = MaxPayloadSize if md5 is None else MaxChecksummedPayloadSize
+        if tags_from + len(tags) > space:
+            raise UF2EncodeError(f'Payload of {payload_size} bytes and {len(tags)} bytes of tags exceed max of {space}')
+    if file_name is not None:
+        if payload_size + len(file_name) + 1 > MaxPayloadSize:
+            raise UF2EncodeError(f'Payload of {payload_size} bytes and file name {file_name} exceed max of {MaxPayloadSize}')
+        
+    if md5 is None:
+        if payload_size > MaxPayloadSize:
+            raise UF2EncodeError(f'Payload of {payload_size} bytes exceeds max of {MaxPayloadSize}')
+        block_struct(payload_size).pack_into(target, offset, 
+                         Magic.START0, magic_start1, 
+                         flags, 
+                         address, 
+                         payload_size, 
+                         block_number, 
+                         total_blocks, 
+                         board_family,
+                         payload,
+                         magic_end)
+    else:
+        if payload_size > MaxChecksummedPayloadSize:
+            raise UF2EncodeError(f'Payload of {payload_size} bytes exceeds max of {MaxChecksummedPayloadSize} with checksum')
+        block_struct(payload_size, True).pack_into(target, offset, 
+                         Magic.START0, magic_start1, 
+                         flags, 
+                         address, 
+                         payload_size, 
+                         block_number, 
+                         total_blocks, 
+                         board_family,
+                         payload,
+                         *md5,
+                         magic_end)
+    
+    if tags is not None:
+        start = offset + 32 + tags_from
+        target[start:start + len(tags)] = tags
+    if file_name is not None:
+        # NUL terminator is already in place, it's padding
+        start = offset + 32 + payload_size
+        target[start:start + len(file_name)] = file_name
+
+
+def unpack_md5(data, offset:int=0) -> tuple:
+    '''
+        The (address, length, digest) checksum trailer of the 
+        raw block at offset within data.
+    '''
+    return MD5Trailer.unpack_from(data, offset + MD5TrailerOffset)
+
+def unpack_tags(data, flags:int, payload_size:int, offset:int=0) -> list:
+    '''
+        The (tag type, raw value) extension tags of the raw block 
+        at offset within data.
+    '''
+    end = MaxPayloadSize if not flags & Flags.MD5ChecksumPresent else MaxChecksummedPayloadSize
+    return parse_tags(data, offset + 32 + tags_start(payload_size), offset + 32 + end)
+
+def unpack_file_name(data, payload_size:int, offset:int=0) -> bytes:
+    '''
+        The NUL terminated file name following the payload of 
+        the raw (file container) block at offset within data.
+    '''
+    start = offset + 32 + payload_size
+    end = offset + 32 + MaxPayloadSize
+    name = bytes(data[start:end])
+    nul = name.find(0)
+    return name if nul < 0 else name[:nul]
+
+_ZeroPayloads = dict()
+
+def zero_payload(size:int) -> bytes:
+    '''
+        A shared, immutable, zero-filled payload of size bytes.
+    '''
+    try:
+        return _ZeroPayloads[size]
+    except KeyError:
+        zeros = bytes(size)
+        _ZeroPayloads[size] = zeros 
+        return zeros
 
 class DataBlock:
     '''
@@ -15,17 +141,85 @@ class DataBlock:
         May be constructed from raw data (fromBlock classmethod)
         or instantiated manually from payload and header
     '''
+    # many thousands of these may be around, skip the per-instance dict
+    __slots__ = ('payload', 'header', 'magic_start1', 'magic_end', 
+                 'record', 'md5', 'tags', 'file_name')
+    
     @classmethod 
-    def fromBlock(cls, data: bytes):
-        hdr = Header.fromBlock(data) 
+    def fromBlock(cls, data: bytes, record:int=None, magic:Magic=None):
+        '''
+            Decode a raw 512 byte block
+            
+            @param record: position of the block in its file, if known
+            @param magic: the file's magic values, if not the standard ones
+        '''
+        hdr = Header.fromBlock(data, magic) 
         payload = data[32:32 + hdr.payload_size]
-        return cls(payload, hdr)
+        if magic is None:
+            blk = cls(payload, hdr)
+        else:
+            blk = cls(payload, hdr, magic_start1=magic.start1, magic_end=magic.end)
+        blk.record = record
+        if hdr.flags & Flags.MD5ChecksumPresent:
+            blk.md5 = unpack_md5(data)
+        if hdr.flags & Flags.ExtensionTagsPresent:
+            blk.tags = dict(unpack_tags(data, hdr.flags, hdr.payload_size))
+        if hdr.flags & Flags.FileContainer:
+            blk.file_name = unpack_file_name(data, hdr.payload_size)
+        return blk
     
     def __init__(self, payload:bytearray, header:Header=None, magic_start1:int=None, magic_end:int=None):
         self.payload = payload 
         self.header = header 
         self.magic_start1 = magic_start1 
         self.magic_end = magic_end
+        # position of the block in the file it was read from, if any
+        self.record = None
+        # (address, length, digest) when Flags.MD5ChecksumPresent
+        self.md5 = None
+        # tag type: raw bytes, when Flags.ExtensionTagsPresent
+        self.tags = None
+        # name of the file (bytes), when Flags.FileContainer
+        self.file_name = None
+        
+    def get_tag(self, tag_type:int):
+        '''
+            Value of an extension tag (see tags.decode_tag), or None.
+        '''
+        if self.tags is None or tag_type not in self.tags:
+            return None 
+        return decode_tag(tag_type, self.tags[tag_type])
+    
+    def set_tag(self, tag_type:int, value):
+        '''
+            Set an extension tag, from a str, int or bytes value.
+        '''
+        if self.tags is None:
+            self.tags = dict()
+        self.tags[tag_type] = tag_bytes(tag_type, value)
+        self.header.flags |= Flags.ExtensionTagsPresent
+        
+    def copy(self):
+        '''
+            A new DataBlock with its own header (and checksum/tags), 
+            sharing this block's payload.  The copy has no record: it 
+            isn't part of the file this block was read from.
+        '''
+        blk = DataBlock(self.payload, Header.deep_copy(self.header), 
+                        magic_start1=self.magic_start1, magic_end=self.magic_end)
+        blk.md5 = self.md5
+        blk.file_name = self.file_name
+        if self.tags is not None:
+            blk.tags = dict(self.tags)
+        return blk
+        
+    def encoded_tags(self) -> bytes:
+        '''
+            Tags, as packed after the payload, or None.
+        '''
+        if self.tags is None or not self.header.flags & Flags.ExtensionTagsPresent:
+            return None
+        return encode_tags(self.tags)
         
         
     @property 
@@ -36,20 +230,26 @@ class DataBlock:
             global knowledge of things, thus a higher level up).
         '''
         target = bytearray(BlockSize)
-        magic_start1 = self.magic_start1 if self.magic_start1 is not None else Magic.START1
-        magic_end = self.magic_end if self.magic_end is not None else Magic.END
-        struct.pack_into('<IIIIIIII', target, 0, 
-                         Magic.START0, magic_start1, 
-                         self.header.flags, 
-                         self.header.address, 
-                         len(self.payload), 
-                         self.header.block_number, 
-                         self.header.total_blocks, 
-                         self.header.board_family)
-        target[32: 32+len(self.payload)] = self.payload
-        struct.pack_into('<I', target, BlockSize - 4, magic_end)
+        self.pack_into(target, 0)
         return target
     
+    def pack_into(self, target, offset:int=0):
+        '''
+            Encode the block into target buffer, at offset.
+            Same assumptions as for as_bytes.
+        '''
+        pack_block(target, offset, 
+                   self.header.flags, 
+                   self.header.address, 
+                   self.payload, 
+                   self.header.block_number, 
+                   self.header.total_blocks, 
+                   self.header.board_family,
+                   self.magic_start1, self.magic_end, 
+                   self.md5 if self.header.flags & Flags.MD5ChecksumPresent else None,
+                   self.encoded_tags(),
+                   self.file_name if self.header.flags & Flags.FileContainer else None)
+    
     
     def __repr__(self):
         return f'<DataBlock {self.header.block_number + 1}/{self.header.total_blocks} ({self.header.payload_size} bytes @ {hex(self.header.address)})'
\ No newline at end of file
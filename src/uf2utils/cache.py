@@ -0,0 +1,137 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+Local, content-addressed, cache for generated UF2 block data.
+
+Entries are keyed by a hash of whatever went into generating them
+(see tree_digest()) and the cache is kept under a size limit by
+evicting the least recently used entries.
+
+    cache = BlockCache('/tmp/uf2cache', max_bytes=512*1024**2)
+    key = tree_digest('/tmp/fs_root', block_size=4096, block_count=352)
+    encoded = cache.get(key)
+    if encoded is None:
+        encoded = build_it()
+        cache.put(key, encoded)
+
+'''
+import hashlib
+import os
+import tempfile
+
+import logging
+log = logging.getLogger(__name__)
+
+DefaultCacheMaxBytes = 1024**3
+CacheEntrySuffix = '.uf2blocks'
+HashChunkSize = 1024*1024
+
+
+def tree_digest(root:str, **params) -> str:
+    '''
+        Hash of a directory tree (relative paths and file contents)
+        along with any other parameters that influence what gets built
+        from it (geometry, offsets, flags...).
+    '''
+    digest = hashlib.sha256()
+    for name in sorted(params):
+        digest.update(f'{name}={params[name]!r}\n'.encode())
+
+    for dirpath, dir_names, file_names in os.walk(root):
+        # walk in a stable order
+        dir_names.sort()
+        rel_dir = os.path.relpath(dirpath, root)
+        digest.update(f'D {rel_dir}\n'.encode())
+        for f in sorted(file_names):
+            path = os.path.join(dirpath, f)
+            digest.update(f'F {os.path.join(rel_dir, f)} {os.path.getsize(path)}\n'.encode())
+            with open(path, 'rb') as src:
+                while True:
+                    chunk = src.read(HashChunkSize)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class BlockCache:
+    '''
+        Size bounded, LRU, on-disk cache of encoded blocks.
+        Entries are plain files, their mtime serves as last use time.
+    '''
+    def __init__(self, directory:str, max_bytes:int=DefaultCacheMaxBytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key:str) -> str:
+        return os.path.join(self.directory, key + CacheEntrySuffix)
+
+    def get(self, key:str) -> bytes:
+        '''
+            Cached data for key, or None on a miss.
+        '''
+        path = self.path_for(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            log.debug(f'Cache miss {key}')
+            return None
+
+        # mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            # evicted by someone else in the meantime
+            log.debug(f'Cache miss {key} (evicted)')
+            return None
+        log.debug(f'Cache hit {key}')
+        return data
+
+    def put(self, key:str, data):
+        '''
+            Store data under key, then evict as required.
+        '''
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # atomic, so concurrent readers never see partial entries
+            os.replace(tmp_path, self.path_for(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        self.evict()
+
+    def evict(self):
+        '''
+            Drop least recently used entries until within max_bytes.
+        '''
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(CacheEntrySuffix):
+                continue
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            log.info(f'Evicting {path} from cache')
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def __repr__(self):
+        return f'<BlockCache {self.directory}>'
@@ -0,0 +1,160 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+Per-block MD5 checksums (Flags.MD5ChecksumPresent).
+
+A checksummed block carries the address, length and MD5 digest of a
+region of flash, in the last 24 bytes of its data area.  The region
+may be just the block's own payload, or some larger area (an erase
+sector, say) the block is part of.
+
+Many blocks usually share the same region, so digests are computed
+once per distinct region.  Regions are hashed in batches and, when
+they are large enough for hashlib to release the GIL, on a thread pool.
+
+    add_checksums(uf2, region_size=4096)
+    uf2.to_file('/tmp/checked.uf2')
+
+    bad = verify_checksums(UF2File('/tmp/checked.uf2', lazy=True))
+    if len(bad):
+        print(f'{len(bad)} blocks failed checksum')
+
+'''
+import concurrent.futures
+import hashlib
+from uf2utils.constants import Flags
+from uf2utils.header import UF2EncodeError
+from uf2utils.block import MaxChecksummedPayloadSize
+from uf2utils.file import UF2File
+
+import logging
+log = logging.getLogger(__name__)
+
+# hashlib only releases the GIL for updates at least this size,
+# smaller regions aren't worth a trip through the thread pool
+ParallelMinRegionSize = 2048
+# amount of data each pool task hashes
+BatchBytes = 1024*1024
+
+
+def region_digests(uf2:UF2File, regions, max_workers:int=None, fill:int=0xff) -> dict:
+    '''
+        MD5 digests of flash regions, as described by uf2.
+
+        @param regions: dict of (address, length): [block indices] or
+        iterable of (address, length). Where a region is exactly the
+        payload of its (only) block, the payload is hashed as is.
+        @param fill: value of bytes in a region not covered by any block
+        (0xff, by default, as for erased flash)
+        @return: dict of (address, length): digest
+    '''
+    if not hasattr(regions, 'items'):
+        regions = dict.fromkeys(regions, [])
+
+    hdrs = uf2.header_index
+    def region_data(region, blocks):
+        if len(blocks) == 1:
+            idx = blocks[0]
+            if (hdrs.address[idx], hdrs.payload_size[idx]) == region:
+                return uf2.block_payload(idx)
+        return uf2.read(region[0], region[1], fill)
+
+    def hash_batch(batch):
+        return [(region, hashlib.md5(region_data(region, blocks)).digest())
+                    for region, blocks in batch]
+
+    batches = []
+    batch = []
+    batch_bytes = 0
+    total_bytes = 0
+    for region, blocks in regions.items():
+        batch.append((region, blocks))
+        batch_bytes += region[1]
+        total_bytes += region[1]
+        if batch_bytes >= BatchBytes:
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+    if len(batch):
+        batches.append(batch)
+
+    digests = dict()
+    if len(batches) > 1 and total_bytes >= len(regions) * ParallelMinRegionSize:
+        # make sure everything is built before the threads get at it
+        uf2.address_index
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for results in pool.map(hash_batch, batches):
+                digests.update(results)
+    else:
+        for batch in batches:
+            digests.update(hash_batch(batch))
+    return digests
+
+
+def add_checksums(uf2:UF2File, region_size:int=None, max_workers:int=None, fill:int=0xff):
+    '''
+        Set Flags.MD5ChecksumPresent, and the checksum trailer, on all blocks.
+
+        @param region_size: None to checksum each block's own payload, otherwise
+        each block gets the checksum of the region_size aligned region(s) it
+        falls within
+        @param fill: value for region bytes not covered by any block
+    '''
+    regions = dict()
+    hdrs = uf2.header_index
+    for idx in range(len(uf2)):
+        address = hdrs.address[idx]
+        size = hdrs.payload_size[idx]
+        if size > MaxChecksummedPayloadSize:
+            raise UF2EncodeError(f'Block {idx} payload of {size} bytes too large to checksum (max {MaxChecksummedPayloadSize})')
+        if region_size is None:
+            region = (address, size)
+        else:
+            start = address - address % region_size
+            end = -(-(address + size) // region_size) * region_size
+            region = (start, end - start)
+        regions.setdefault(region, []).append(idx)
+
+    digests = region_digests(uf2, regions, max_workers, fill)
+    for region, blocks in regions.items():
+        md5 = (region[0], region[1], digests[region])
+        for idx in blocks:
+            blk = uf2[idx]
+            blk.header.flags |= Flags.MD5ChecksumPresent
+            blk.md5 = md5
+
+    uf2.reindex()
+    log.info(f'Added checksums to {len(uf2)} blocks, over {len(regions)} regions')
+
+
+def verify_checksums(uf2:UF2File, max_workers:int=None, fill:int=0xff) -> list:
+    '''
+        Check every checksummed block's digest against the contents of
+        the image.
+
+        @param fill: value for region bytes not covered by any block
+        @return: list of indices of blocks that failed (empty if all is well)
+    '''
+    expected = dict()
+    regions = dict()
+    for idx in range(len(uf2)):
+        md5 = uf2.block_md5(idx)
+        if md5 is None:
+            continue
+        region = (md5[0], md5[1])
+        expected[idx] = md5[2]
+        regions.setdefault(region, []).append(idx)
+
+    digests = region_digests(uf2, regions, max_workers, fill)
+    failed = []
+    for region, blocks in regions.items():
+        for idx in blocks:
+            if expected[idx] != digests[region]:
+                failed.append(idx)
+
+    failed.sort()
+    log.info(f'Verified {len(expected)} checksummed blocks, {len(failed)} failed')
+    return failed
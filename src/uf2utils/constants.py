@@ -10,9 +10,46 @@ MaxPayloadSize = 476
 DefaultBlockPayloadSize = 256
 
 class Magic:
+    '''
+        The class attributes are the standard (default) magic values.
+        Instances hold the set used for a given file, so files with 
+        different magic may be handled side by side:
+        
+            magic = Magic(start1=0x12345678)
+            
+        Values not given (or set to None) follow the class attributes,
+        looked up whenever they're used.
+    '''
     START0 = 0x0A324655 
     START1 = 0x9E5D5157 
     END    = 0x0AB16F30 
+    
+    def __init__(self, start1:int=None, end:int=None):
+        self._start1 = start1 
+        self._end = end
+        
+    @property 
+    def start0(self) -> int:
+        return Magic.START0 
+    
+    @property 
+    def start1(self) -> int:
+        return Magic.START1 if self._start1 is None else self._start1 
+    
+    @start1.setter 
+    def start1(self, set_to:int):
+        self._start1 = set_to 
+        
+    @property 
+    def end(self) -> int:
+        return Magic.END if self._end is None else self._end 
+    
+    @end.setter 
+    def end(self, set_to:int):
+        self._end = set_to
+        
+    def __repr__(self):
+        return f'<Magic {hex(self.start0)} {hex(self.start1)} {hex(self.end)}>'
 
 class Flags:
     NotMainFlash = 0x00000001
@@ -0,0 +1,181 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+File containers (Flags.FileContainer): named files, rather than flash
+contents, packed into UF2 blocks.
+
+In each block the address is the offset within the file, the board
+family field holds the total file size and the NUL terminated file name
+follows the payload.
+
+Both directions stream: files are read in block sized chunks as they
+are packed and, when unpacking, each block is written to its file as
+soon as it comes in.
+
+    pack_directory('/tmp/assets.uf2', '/tmp/assets')
+    for name in unpack_files(open('/tmp/assets.uf2', 'rb'), '/tmp/out'):
+        print(f'Extracted {name}')
+
+'''
+import os
+import posixpath
+from uf2utils.constants import DefaultBlockPayloadSize, MaxPayloadSize, Flags
+from uf2utils.header import Header, UF2EncodeError, UF2DecodeError
+from uf2utils.stream import UF2StreamWriter, iter_chunks, iter_blocks
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _source_size(source) -> int:
+    if isinstance(source, str):
+        return os.path.getsize(source)
+    if hasattr(source, 'read'):
+        pos = source.tell()
+        end = source.seek(0, os.SEEK_END)
+        source.seek(pos)
+        return end - pos
+    return len(source)
+
+
+def pack_files(output, files, block_payload_size:int=DefaultBlockPayloadSize,
+               magic_start1:int=None, magic_end:int=None) -> int:
+    '''
+        Pack files into a file container UF2.
+
+        @param output: path to, or binary file object for, the UF2
+        @param files: iterable of paths (stored under that name) or of
+        (name, source) pairs, source being a path, bytes-like or a
+        seekable binary file object
+        @param block_payload_size: max payload per block (reduced, for
+        long names, so payload and name fit)
+        @return: number of blocks written
+    '''
+    header = Header(Flags.FileContainer, 0, 0, 0, 0, 0)
+    with UF2StreamWriter(output, header, magic_start1=magic_start1,
+                         magic_end=magic_end) as writer:
+        for entry in files:
+            if isinstance(entry, str):
+                name, source = entry, entry
+            else:
+                name, source = entry
+
+            file_name = name.encode('utf-8')
+            size = _source_size(source)
+            payload_size = min(block_payload_size, MaxPayloadSize - len(file_name) - 1)
+            if payload_size <= 0:
+                raise UF2EncodeError(f'File name {name} too long')
+
+            log.debug(f'Packing {name} ({size} bytes)')
+            if not size:
+                # so empty files exist, on the other side
+                writer.write_block(0, b'', Flags.FileContainer, 0, file_name=file_name)
+                continue
+
+            opened = isinstance(source, str)
+            src = open(source, 'rb') if opened else source
+            try:
+                offset = 0
+                for chunk in iter_chunks(src, payload_size):
+                    writer.write_block(offset, chunk, Flags.FileContainer, size,
+                                       file_name=file_name)
+                    offset += len(chunk)
+            finally:
+                if opened:
+                    src.close()
+
+            if offset != size:
+                raise UF2EncodeError(f'{name} changed size while being packed')
+
+        return writer.num_blocks
+
+
+def pack_directory(output, root:str, **kwargs) -> int:
+    '''
+        Pack all files under root, named by their (posix style) path
+        relative to root.
+
+        @see: pack_files() for kwargs
+    '''
+    def walk():
+        for dirpath, dir_names, file_names in os.walk(root):
+            dir_names.sort()
+            rel_dir = os.path.relpath(dirpath, root)
+            for f in sorted(file_names):
+                name = f if rel_dir == '.' else posixpath.join(*rel_dir.split(os.sep), f)
+                yield (name, os.path.join(dirpath, f))
+
+    return pack_files(output, walk(), **kwargs)
+
+
+def iter_container(source):
+    '''
+        Generator of (name, offset, file_size, payload) for each file
+        container block in a stream, as it arrives.  Other blocks are
+        skipped.
+
+        @see: stream.iter_records() for the types of source supported
+    '''
+    for blk in iter_blocks(source):
+        if not blk.header.flags & Flags.FileContainer:
+            continue
+        yield (blk.file_name.decode('utf-8'), blk.header.address,
+               blk.header.board_family, blk.payload)
+
+
+def container_path(out_dir:str, name:str) -> str:
+    '''
+        Where name goes, under out_dir.
+
+        @raise UF2DecodeError: for names that would end up elsewhere
+    '''
+    parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.')]
+    if not len(parts) or '..' in parts:
+        raise UF2DecodeError(f'Invalid file name in container: {name!r}')
+    return os.path.join(out_dir, *parts)
+
+
+def unpack_files(source, out_dir:str):
+    '''
+        Write out the files in a container UF2 stream, block by block.
+
+        @param source: stream (or path) of the UF2 data
+        @param out_dir: directory under which files are created
+        @return: generator of file names, as each is started
+    '''
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            yield from unpack_files(f, out_dir)
+        return
+
+    seen = set()
+    current_name = None
+    current = None
+    try:
+        for name, offset, file_size, payload in iter_container(source):
+            if name != current_name:
+                if current is not None:
+                    current.close()
+                    current = None
+                path = container_path(out_dir, name)
+                if name in seen:
+                    # blocks of a file needn't be contiguous
+                    current = open(path, 'r+b')
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    current = open(path, 'wb')
+                    current.truncate(file_size)
+                    seen.add(name)
+                    yield name
+                current_name = name
+
+            if offset + len(payload) > file_size:
+                raise UF2DecodeError(f'Block @ {offset} beyond end of {name} ({file_size} bytes)')
+            current.seek(offset)
+            current.write(payload)
+    finally:
+        if current is not None:
+            current.close()
@@ -0,0 +1,447 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+Conversions between UF2 and ELF, Intel HEX or raw binaries, in a
+single streaming pass: input is decoded as it is read and blocks are
+written out as soon as each is complete, so neither side is ever held
+in memory whole.
+
+    fam = Family.byName('RP2040').id
+    elf_to_uf2('/tmp/firmware.elf', '/tmp/firmware.uf2', fam)
+    hex_to_uf2('/tmp/firmware.hex', '/tmp/firmware.uf2', fam)
+
+    uf2_to_hex('/tmp/firmware.uf2', '/tmp/firmware.hex')
+    uf2_to_bin('/tmp/firmware.uf2', '/tmp/firmware.bin')
+
+ELF and HEX contents are laid out in block_payload_size pages, aligned
+on that size, as bootloaders expect, with any bytes of a page not
+covered by the input set to fill.  Content must come in (page) order:
+going back to a page already written out is an error, rather than
+an ambiguous pair of blocks.
+'''
+import os
+import struct
+from uf2utils.constants import DefaultBlockPayloadSize, MaxPayloadSize, Flags
+from uf2utils.header import Header, UF2EncodeError, UF2DecodeError
+from uf2utils.stream import UF2StreamWriter, StreamReadSize, iter_blocks
+
+import logging
+log = logging.getLogger(__name__)
+
+# data bytes per record, in HEX output
+HexRecordSize = 16
+
+class HexRecordType:
+    Data = 0x00
+    EndOfFile = 0x01
+    ExtendedSegmentAddress = 0x02
+    StartSegmentAddress = 0x03
+    ExtendedLinearAddress = 0x04
+    StartLinearAddress = 0x05
+
+
+ElfMagic = b'\x7fELF'
+ElfIdentSize = 16
+ElfClass32 = 1
+ElfClass64 = 2
+ElfDataLSB = 1
+ElfDataMSB = 2
+PT_LOAD = 1
+
+# from e_type to e_phnum, following e_ident
+_ElfHeaderFormats = {ElfClass32: 'HHIIIIIHHH', ElfClass64: 'HHIQQQIHHH'}
+# (type, offset, paddr, filesz) positions in each program header
+_ElfProgramHeaderFormats = {
+    ElfClass32: ('IIIIIIII', (0, 1, 3, 4)),
+    ElfClass64: ('IIQQQQQQ', (0, 2, 4, 5)),
+}
+
+# blocks that aren't flash contents, skipped when converting from UF2
+SkippedFlags = Flags.NotMainFlash | Flags.FileContainer
+
+
+class UF2ConvertError(UF2DecodeError):
+    pass
+
+
+class _PagedBlocks:
+    '''
+        Lays out (address, data) pieces as page aligned blocks, written
+        to a UF2StreamWriter as each page is done.
+    '''
+    def __init__(self, writer:UF2StreamWriter, page_size:int, fill:int):
+        self.writer = writer
+        self.page_size = page_size
+        self.fill = fill
+        self.page_address = None
+        self.page = None
+        self.written = set()
+
+    def write(self, address:int, data):
+        view = memoryview(data)
+        page_size = self.page_size
+        while len(view):
+            page_address = address - (address % page_size)
+            offset = address - page_address
+            num = min(len(view), page_size - offset)
+            if page_address != self.page_address:
+                self.flush()
+                if page_address in self.written:
+                    raise UF2ConvertError(f'Data for {hex(address)} comes after its page was written out (input not in address order?)')
+                if num == page_size:
+                    # whole page, straight through
+                    self.writer.write_block(page_address, view[:num])
+                    self.written.add(page_address)
+                    address += num
+                    view = view[num:]
+                    continue
+                self.page_address = page_address
+                self.page = bytearray((self.fill,)) * page_size
+
+            self.page[offset:offset + num] = view[:num]
+            address += num
+            view = view[num:]
+
+    def flush(self):
+        if self.page is None:
+            return
+        self.writer.write_block(self.page_address, self.page)
+        self.written.add(self.page_address)
+        self.page_address = None
+        self.page = None
+
+
+def _check_payload_size(block_payload_size:int):
+    if block_payload_size <= 0 or block_payload_size > MaxPayloadSize:
+        raise UF2EncodeError(f'Block payload size must be between 1 and {MaxPayloadSize}')
+
+
+def _header_for(board_family:int) -> Header:
+    if board_family is None:
+        return Header(0, 0, 0, 0, 0, 0)
+    return Header(Flags.FamilyIDPresent, 0, 0, 0, 0, board_family)
+
+
+def iter_hex_records(source):
+    '''
+        Generator of (address, data) for each data record of Intel HEX
+        input, as it is read.
+
+        @param source: path, text or binary file object, or iterable of lines
+        @raise UF2ConvertError: on malformed records
+    '''
+    if isinstance(source, str):
+        with open(source, 'r') as f:
+            yield from iter_hex_records(f)
+        return
+
+    base = 0
+    for line_num, line in enumerate(source, 1):
+        if isinstance(line, (bytes, bytearray)):
+            line = line.decode('ascii', errors='replace')
+        line = line.strip()
+        if not len(line):
+            continue
+        try:
+            if line[0] != ':':
+                raise ValueError('no start code')
+            raw = bytes.fromhex(line[1:])
+            if len(raw) < 5 or len(raw) != raw[0] + 5:
+                raise ValueError('bad length')
+        except ValueError as e:
+            raise UF2ConvertError(f'Invalid HEX record on line {line_num} ({e})')
+        if sum(raw) & 0xff:
+            raise UF2ConvertError(f'Bad HEX record checksum on line {line_num}')
+
+        rec_type = raw[3]
+        data = raw[4:-1]
+        if rec_type == HexRecordType.Data:
+            yield (base + ((raw[1] << 8) | raw[2]), data)
+        elif rec_type == HexRecordType.EndOfFile:
+            return
+        elif rec_type == HexRecordType.ExtendedSegmentAddress:
+            base = int.from_bytes(data, 'big') << 4
+        elif rec_type == HexRecordType.ExtendedLinearAddress:
+            base = int.from_bytes(data, 'big') << 16
+        elif rec_type not in (HexRecordType.StartSegmentAddress,
+                              HexRecordType.StartLinearAddress):
+            raise UF2ConvertError(f'Unknown HEX record type {rec_type} on line {line_num}')
+
+
+def hex_to_uf2(source, output, board_family:int=None,
+               block_payload_size:int=DefaultBlockPayloadSize, fill:int=0,
+               magic_start1:int=None, magic_end:int=None) -> int:
+    '''
+        Convert Intel HEX to UF2.
+
+        @param source: as for iter_hex_records()
+        @param output: path to, or seekable binary file object for, the UF2
+        @param board_family: family id for all blocks, if any
+        @param fill: value of page bytes not covered by the HEX data
+        @return: number of blocks written
+    '''
+    _check_payload_size(block_payload_size)
+    with UF2StreamWriter(output, _header_for(board_family),
+                         magic_start1=magic_start1, magic_end=magic_end) as writer:
+        pages = _PagedBlocks(writer, block_payload_size, fill)
+        for address, data in iter_hex_records(source):
+            pages.write(address, data)
+        pages.flush()
+        return writer.num_blocks
+
+
+def elf_segments(f) -> list:
+    '''
+        The loadable contents of an ELF file: (load address, file offset,
+        size) of every PT_LOAD segment with data in the file, by address.
+
+        Load addresses are the physical ones (LMA), where the segment
+        lives in flash, which may differ from where it runs.
+    '''
+    ident = f.read(ElfIdentSize)
+    if len(ident) != ElfIdentSize or ident[:4] != ElfMagic:
+        raise UF2ConvertError('Not an ELF file')
+    elf_class = ident[4]
+    if elf_class not in _ElfHeaderFormats or ident[5] not in (ElfDataLSB, ElfDataMSB):
+        raise UF2ConvertError(f'Unsupported ELF class/encoding {elf_class}/{ident[5]}')
+
+    endian = '<' if ident[5] == ElfDataLSB else '>'
+    header = struct.Struct(endian + _ElfHeaderFormats[elf_class])
+    fields = header.unpack(f.read(header.size))
+    ph_offset, ph_entry_size, ph_num = fields[4], fields[8], fields[9]
+
+    ph_format, (i_type, i_offset, i_paddr, i_filesz) = _ElfProgramHeaderFormats[elf_class]
+    ph_struct = struct.Struct(endian + ph_format)
+    if ph_num and ph_entry_size < ph_struct.size:
+        raise UF2ConvertError(f'Invalid ELF program header size {ph_entry_size}')
+
+    segments = []
+    for i in range(ph_num):
+        f.seek(ph_offset + i * ph_entry_size)
+        raw = f.read(ph_struct.size)
+        if len(raw) != ph_struct.size:
+            raise UF2ConvertError('Truncated ELF program headers')
+        ph = ph_struct.unpack(raw)
+        if ph[i_type] == PT_LOAD and ph[i_filesz]:
+            segments.append((ph[i_paddr], ph[i_offset], ph[i_filesz]))
+
+    segments.sort()
+    return segments
+
+
+def elf_to_uf2(source, output, board_family:int=None,
+               block_payload_size:int=DefaultBlockPayloadSize, fill:int=0,
+               magic_start1:int=None, magic_end:int=None) -> int:
+    '''
+        Convert the PT_LOAD segments of an ELF file to UF2.
+
+        The block count is known from the program headers, so output may
+        be any binary stream (a pipe, say).
+
+        @param source: path to, or seekable binary file object for, the ELF
+        @param output: path to, or binary file object for, the UF2
+        @param board_family: family id for all blocks, if any
+        @param fill: value of page bytes not covered by a segment
+        @return: number of blocks written
+    '''
+    _check_payload_size(block_payload_size)
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return elf_to_uf2(f, output, board_family, block_payload_size, fill,
+                              magic_start1, magic_end)
+
+    segments = elf_segments(source)
+    page_addresses = set()
+    for address, _offset, size in segments:
+        first = address - (address % block_payload_size)
+        page_addresses.update(range(first, address + size, block_payload_size))
+
+    with UF2StreamWriter(output, _header_for(board_family), len(page_addresses),
+                         magic_start1=magic_start1, magic_end=magic_end) as writer:
+        pages = _PagedBlocks(writer, block_payload_size, fill)
+        for address, offset, size in segments:
+            log.debug(f'Segment of {size} bytes @ {hex(address)}')
+            source.seek(offset)
+            while size:
+                chunk = source.read(min(size, StreamReadSize))
+                if not chunk:
+                    raise UF2ConvertError(f'ELF segment @ {hex(address)} truncated')
+                pages.write(address, chunk)
+                address += len(chunk)
+                size -= len(chunk)
+        pages.flush()
+        return writer.num_blocks
+
+
+def bin_to_uf2(source, output, base_address:int, board_family:int=None,
+               block_payload_size:int=DefaultBlockPayloadSize,
+               magic_start1:int=None, magic_end:int=None) -> int:
+    '''
+        Convert a raw binary, loaded at base_address, to UF2.
+
+        @param source: path, bytes-like or binary file object
+        @return: number of blocks written
+    '''
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return bin_to_uf2(f, output, base_address, board_family, block_payload_size,
+                              magic_start1, magic_end)
+
+    with UF2StreamWriter(output, _header_for(board_family),
+                         magic_start1=magic_start1, magic_end=magic_end) as writer:
+        writer.write_payload(source, base_address, block_payload_size)
+        return writer.num_blocks
+
+
+def _flash_blocks(source, board_family:int=None):
+    '''
+        The flash content blocks of a UF2 stream (or path), optionally
+        only those of board_family.
+    '''
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            yield from _flash_blocks(f, board_family)
+        return
+
+    for blk in iter_blocks(source):
+        hdr = blk.header
+        if hdr.flags & SkippedFlags:
+            continue
+        if board_family is not None and hdr.board_family != board_family:
+            continue
+        yield blk
+
+
+def _hex_record(rec_type:int, address:int, data) -> str:
+    rec = bytearray((len(data), (address >> 8) & 0xff, address & 0xff, rec_type))
+    rec += data
+    rec.append(-sum(rec) & 0xff)
+    return ':' + rec.hex().upper() + '\n'
+
+
+def uf2_to_hex(source, output, board_family:int=None) -> int:
+    '''
+        Convert UF2 to Intel HEX, block by block.  Only addresses the
+        UF2 actually holds get records, gaps stay gaps.
+
+        @param source: path to, or binary stream of, the UF2
+        @param output: path to, or text file object for, the HEX
+        @param board_family: only convert blocks of this family
+        @return: number of payload bytes converted
+    '''
+    if isinstance(output, str):
+        with open(output, 'w') as f:
+            return uf2_to_hex(source, f, board_family)
+
+    upper = 0
+    num_bytes = 0
+    for blk in _flash_blocks(source, board_family):
+        address = blk.header.address
+        payload = memoryview(blk.payload)
+        pos = 0
+        while pos < len(payload):
+            if address >> 16 != upper:
+                upper = address >> 16
+                output.write(_hex_record(HexRecordType.ExtendedLinearAddress, 0,
+                                         upper.to_bytes(2, 'big')))
+            # records can't straddle a 64k boundary
+            num = min(HexRecordSize, len(payload) - pos, 0x10000 - (address & 0xffff))
+            output.write(_hex_record(HexRecordType.Data, address & 0xffff,
+                                     payload[pos:pos + num]))
+            address += num
+            pos += num
+        num_bytes += len(payload)
+
+    output.write(_hex_record(HexRecordType.EndOfFile, 0, b''))
+    return num_bytes
+
+
+def uf2_to_bin(source, output, base_address:int=None, board_family:int=None,
+               fill:int=0) -> int:
+    '''
+        Convert UF2 to a raw binary image starting at base_address, block
+        by block.
+
+        Gaps are filled with fill bytes or, when fill is 0 and output is
+        seekable, skipped over so file systems that can may leave holes.
+        Blocks may only come out of address order if output is seekable.
+
+        @param source: path to, or binary stream of, the UF2
+        @param output: path to, or binary file object for, the image
+        @param base_address: address of the first byte of the image
+        (defaults to that of the first block), anything below is left out
+        @return: size of the image
+    '''
+    if isinstance(output, str):
+        with open(output, 'wb') as f:
+            return uf2_to_bin(source, f, base_address, board_family, fill)
+
+    seekable = output.seekable()
+    start_pos = output.tell() if seekable else 0
+    pos = 0
+    size = 0
+    fill_chunk = None
+    for blk in _flash_blocks(source, board_family):
+        if base_address is None:
+            base_address = blk.header.address
+        offset = blk.header.address - base_address
+        payload = blk.payload
+        if offset < 0:
+            # only what's at base_address and up
+            if offset + len(payload) <= 0:
+                continue
+            payload = payload[-offset:]
+            offset = 0
+
+        if offset != pos:
+            if offset > size and not (seekable and fill == 0):
+                # gap beyond anything written so far
+                if pos != size:
+                    output.seek(start_pos + size)
+                if fill_chunk is None:
+                    fill_chunk = bytes((fill,)) * StreamReadSize
+                pos = size
+                while pos < offset:
+                    pos += output.write(fill_chunk[:min(StreamReadSize, offset - pos)])
+            elif not seekable:
+                raise UF2ConvertError(f'Block @ {hex(blk.header.address)} out of order, output must be seekable')
+            else:
+                output.seek(start_pos + offset)
+
+        output.write(payload)
+        pos = offset + len(payload)
+        size = max(size, pos)
+
+    if seekable:
+        # a trailing hole, or sparse gaps, still count towards the size
+        output.truncate(start_pos + size)
+    return size
+
+
+def convert(source:str, output:str, **kwargs) -> int:
+    '''
+        Convert according to the file extensions: .elf, .hex/.ihex or
+        .bin to .uf2 or .uf2 to .hex/.ihex or .bin.
+
+        @see: the individual conversions for kwargs (bin_to_uf2()
+        needs base_address)
+    '''
+    in_ext = os.path.splitext(source)[1].lower()
+    out_ext = os.path.splitext(output)[1].lower()
+    if out_ext == '.uf2':
+        if in_ext == '.elf':
+            return elf_to_uf2(source, output, **kwargs)
+        if in_ext in ('.hex', '.ihex'):
+            return hex_to_uf2(source, output, **kwargs)
+        if in_ext == '.bin':
+            return bin_to_uf2(source, output, **kwargs)
+    elif in_ext == '.uf2':
+        if out_ext in ('.hex', '.ihex'):
+            return uf2_to_hex(source, output, **kwargs)
+        if out_ext == '.bin':
+            return uf2_to_bin(source, output, **kwargs)
+
+    raise UF2ConvertError(f'Cannot convert {in_ext or source} to {out_ext or output}')
@@ -0,0 +1,253 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+Comparison of UF2 images by flash address (rather than by block).
+
+Both images are walked together, in address order, through their
+address indexes, so the comparison is linear and block payloads are
+never assembled into complete images.
+
+    old = UF2File('/tmp/v1.uf2', lazy=True, use_mmap=True)
+    new = UF2File('/tmp/v2.uf2', lazy=True, use_mmap=True)
+    for d in diff(old, new):
+        print(d)
+
+    delta(old, new).to_file('/tmp/v1-to-v2.uf2')
+
+'''
+import heapq
+from uf2utils.file import UF2File
+
+# unequal stretches are narrowed down this many bytes at a time
+DiffScanChunk = 16
+
+
+class DiffRange:
+    '''
+        A contiguous range of addresses that differs between images.
+        old or new is None when that image has no content there.
+    '''
+    Changed = 'changed'
+    Added = 'added'
+    Removed = 'removed'
+
+    def __init__(self, address:int, old:bytes, new:bytes):
+        self.address = address
+        self.old = old
+        self.new = new
+
+    @property
+    def kind(self) -> str:
+        if self.old is None:
+            return self.Added
+        if self.new is None:
+            return self.Removed
+        return self.Changed
+
+    @property
+    def size(self) -> int:
+        return len(self.new if self.new is not None else self.old)
+
+    @property
+    def end(self) -> int:
+        return self.address + self.size
+
+    def __repr__(self):
+        return f'<DiffRange {self.kind} {hex(self.address)} - {hex(self.end)} ({self.size} bytes)>'
+
+
+def _segments(uf2:UF2File):
+    '''
+        (start, end, block index, block address) in address order, for 
+        the bytes of each block UF2File.read() would return.  Should 
+        blocks overlap, the later one (by address) wins, as it does there.
+    '''
+    idx = uf2.address_index
+    num = len(idx)
+    # blocks covering the cursor, latest (by address) on top
+    covering = []
+    pos = 0
+    cursor = 0
+    while pos < num or len(covering):
+        if not len(covering):
+            cursor = idx.starts[pos]
+        while pos < num and idx.starts[pos] <= cursor:
+            if idx.ends[pos] > cursor:
+                heapq.heappush(covering, (-pos, idx.ends[pos]))
+            pos += 1
+        while len(covering) and covering[0][1] <= cursor:
+            heapq.heappop(covering)
+        if not len(covering):
+            continue
+
+        top, stop = covering[0]
+        if pos < num:
+            stop = min(stop, idx.starts[pos])
+        yield (cursor, stop, idx.order[-top], idx.starts[-top])
+        cursor = stop
+
+
+def _differing_runs(old, new):
+    '''
+        (from, to) offsets of the runs of bytes differing between
+        two same-length buffers
+    '''
+    if old == new:
+        return
+    run_start = None
+    length = len(old)
+    pos = 0
+    while pos < length:
+        chunk_end = min(pos + DiffScanChunk, length)
+        if old[pos:chunk_end] == new[pos:chunk_end]:
+            if run_start is not None:
+                yield (run_start, pos)
+                run_start = None
+            pos = chunk_end
+            continue
+
+        for i in range(pos, chunk_end):
+            if old[i] != new[i]:
+                if run_start is None:
+                    run_start = i
+            elif run_start is not None:
+                yield (run_start, i)
+                run_start = None
+        pos = chunk_end
+
+    if run_start is not None:
+        yield (run_start, length)
+
+
+class _RangeBuilder:
+    '''
+        Accumulates contiguous bits of difference into DiffRanges
+    '''
+    def __init__(self):
+        self.address = None
+        self.end = None
+        self.old = None
+        self.new = None
+
+    def add(self, address:int, old, new):
+        '''
+            @return: a completed DiffRange, if adding this closed one
+        '''
+        completed = None
+        if self.address is not None:
+            if address == self.end and (old is None) == (self.old is None) \
+                    and (new is None) == (self.new is None):
+                if old is not None:
+                    self.old += old
+                if new is not None:
+                    self.new += new
+                self.end += len(old if old is not None else new)
+                return None
+            completed = self.flush()
+
+        self.address = address
+        self.end = address + len(old if old is not None else new)
+        self.old = bytearray(old) if old is not None else None
+        self.new = bytearray(new) if new is not None else None
+        return completed
+
+    def flush(self):
+        if self.address is None:
+            return None
+        completed = DiffRange(self.address,
+                              bytes(self.old) if self.old is not None else None,
+                              bytes(self.new) if self.new is not None else None)
+        self.address = None
+        return completed
+
+
+def diff(old:UF2File, new:UF2File):
+    '''
+        Generator of DiffRanges, in address order, for every
+        address whose contents differ between old and new (including
+        addresses present in only one of them).
+    '''
+    seg_old = _segments(old)
+    seg_new = _segments(new)
+    cur_old = next(seg_old, None)
+    cur_new = next(seg_new, None)
+    builder = _RangeBuilder()
+    pos = 0
+    while cur_old is not None or cur_new is not None:
+        # where does the next stretch start...
+        starts = [c[0] for c in (cur_old, cur_new) if c is not None]
+        pos = max(pos, min(starts))
+        in_old = cur_old is not None and cur_old[0] <= pos
+        in_new = cur_new is not None and cur_new[0] <= pos
+
+        # ...and where does it end
+        bounds = []
+        for cur, inside in ((cur_old, in_old), (cur_new, in_new)):
+            if cur is not None:
+                bounds.append(cur[1] if inside else cur[0])
+        stop = min(bounds)
+
+        old_bytes = None
+        new_bytes = None
+        if in_old:
+            old_bytes = old.block_payload(cur_old[2])[pos - cur_old[3]:stop - cur_old[3]]
+        if in_new:
+            new_bytes = new.block_payload(cur_new[2])[pos - cur_new[3]:stop - cur_new[3]]
+
+        pieces = []
+        if in_old and in_new:
+            for run_from, run_to in _differing_runs(old_bytes, new_bytes):
+                pieces.append((pos + run_from, old_bytes[run_from:run_to], new_bytes[run_from:run_to]))
+        else:
+            pieces.append((pos, old_bytes, new_bytes))
+
+        for address, o, n in pieces:
+            completed = builder.add(address, o, n)
+            if completed is not None:
+                yield completed
+
+        pos = stop
+        if cur_old is not None and cur_old[1] <= pos:
+            cur_old = next(seg_old, None)
+        if cur_new is not None and cur_new[1] <= pos:
+            cur_new = next(seg_new, None)
+
+    completed = builder.flush()
+    if completed is not None:
+        yield completed
+
+
+def delta(old:UF2File, new:UF2File, diffs:list=None) -> UF2File:
+    '''
+        A UF2File holding only the blocks of new that differ from old
+        (payloads are shared, not copied).
+
+        @note: addresses present only in old can't be expressed in a UF2
+        and are ignored.
+        @param diffs: result of diff(old, new), if already available, or
+        just the (address, end) of those ranges with content in new
+    '''
+    if diffs is None:
+        diffs = diff(old, new)
+
+    wanted = set()
+    idx = new.address_index
+    for d in diffs:
+        if isinstance(d, DiffRange):
+            if d.new is None:
+                continue
+            d = (d.address, d.end)
+        wanted.update(idx.overlapping(d[0], d[1]))
+
+    out = UF2File(board_family=new.header.board_family,
+                  magic_start=new.magic_start1,
+                  magic_end=new.magic_end)
+    out.header.flags = new.header.flags
+    out.add_mapped_source(new)
+    for pos in idx.order:
+        if pos in wanted:
+            out.append_datablock(new[pos].copy())
+    return out
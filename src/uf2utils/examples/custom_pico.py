@@ -25,11 +25,18 @@ The FamilyIDPresent flag must be set and, in order to function
 '''
 import logging
 import argparse
+import io
 import os
-import tempfile
+from collections import deque
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
 
 from littlefs import LittleFS
 from uf2utils.file import UF2File
+from uf2utils.header import Header
+from uf2utils.constants import DefaultBlockPayloadSize, Magic
+from uf2utils.stream import UF2StreamWriter, iter_blocks
+from uf2utils.cache import BlockCache, DefaultCacheMaxBytes, tree_digest
 import uf2utils.family 
 
 logging.basicConfig(level=logging.INFO)
@@ -88,49 +95,170 @@ def get_args():
                         required=False,
                         type=int,
                         help='Block count for entire upython FS -- override if must, but calculated using pico-flash/hw-flash-storage')
+    add_cache_args(parser)
     
     return parser.parse_args()
 
+def add_cache_args(parser):
+    parser.add_argument('--cache-dir', required=False, 
+                        default=None,
+                        help='Directory in which to cache generated filesystems (no caching if unset)')
+    parser.add_argument('--cache-max-mb', required=False, 
+                        type=int,
+                        default=DefaultCacheMaxBytes // 1024**2,
+                        help='Size limit for cache (MB) [%(default)s]')
+    
+def get_cache(args):
+    if args.cache_dir is None:
+        return None 
+    return BlockCache(args.cache_dir, args.cache_max_mb * 1024**2)
+
+    
+
+# source files are read ahead on a thread pool, up to this many at once
+PrefetchFilesMax = 64
+# anything larger is streamed in chunks, rather than read in whole
+PrefetchBytesMax = 1024*1024
+CopyChunkSize = 64*1024
+
+def _read_source(path:str):
+    if os.path.getsize(path) > PrefetchBytesMax:
+        return None # streamed later
+    with open(path, 'rb') as src_file:
+        return src_file.read()
     
+def _prefetched(paths:list, max_workers:int=None):
+    '''
+        Yield (path, contents) for all paths, in order, while reading 
+        ahead concurrently.  Contents is None for large files.
+    '''
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        for path in paths:
+            pending.append((path, pool.submit(_read_source, path)))
+            if len(pending) >= PrefetchFilesMax:
+                path_done, fut = pending.popleft()
+                yield path_done, fut.result()
+        while len(pending):
+            path_done, fut = pending.popleft()
+            yield path_done, fut.result()
+
+def _copy_to_lfs(lfs:LittleFS, src_path:str, contents, dest:str):
+    with lfs.open(dest, 'wb') as lfs_file:
+        if contents is not None:
+            view = memoryview(contents)
+            for i in range(0, len(view), CopyChunkSize):
+                lfs_file.write(view[i:i + CopyChunkSize])
+            return 
+        
+        with open(src_path, 'rb') as src_file:
+            while True:
+                chunk = src_file.read(CopyChunkSize)
+                if not chunk:
+                    break
+                lfs_file.write(chunk)
 
-def prep_filesystem(files_from_dir:str, block_count:int, to_base_dir:str='/'):
+def prep_filesystem(files_from_dir:str, block_count:int, to_base_dir:str='/', 
+                    max_workers:int=None):
     
     log.info(f"Prepping LittleFS with {block_count} blocks of {PicoUpythonFSBlocksize} (total {block_count * PicoUpythonFSBlocksize / 1024**2}M)")
     lfs = LittleFS(block_size=PicoUpythonFSBlocksize, 
                    block_count=block_count, 
                    prog_size=PicoUpythonFSProgSize)
+    # walk first, so reading can be done ahead, concurrently,
+    # while LittleFS ops proceed here, in the original order
+    operations = []
+    sources = []
     for root, dir_names, file_names in os.walk(files_from_dir):
         lfs_base = root.replace(f'{files_from_dir}', to_base_dir).replace('//', '/')
         for new_dir in dir_names:
-            ndir = os.path.join(lfs_base, new_dir).replace('//', '/')
-            log.info(f'mkdir {ndir}')
-            lfs.mkdir(ndir)
+            operations.append((None, os.path.join(lfs_base, new_dir).replace('//', '/')))
             
-        log.info('Copying files...')
         for f in file_names:
-            dest = os.path.join(lfs_base, f).replace('//', '/')
-            log.debug(f'cp {os.path.join(root,f)} {lfs_base}')
-            with open(os.path.join(root,f), 'rb') as src_file:
-                with lfs.open(dest, 'wb') as lfs_file:
-                    lfs_file.write(src_file.read())
-        
+            src_path = os.path.join(root,f)
+            sources.append(src_path)
+            operations.append((src_path, os.path.join(lfs_base, f).replace('//', '/')))
+    
+    log.info(f'Copying {len(sources)} files...')
+    with closing(_prefetched(sources, max_workers)) as contents:
+        for src_path, dest in operations:
+            if src_path is None:
+                log.debug(f'mkdir {dest}')
+                lfs.mkdir(dest)
+                continue
+            
+            log.debug(f'cp {src_path} {dest}')
+            _src, data = next(contents)
+            _copy_to_lfs(lfs, src_path, data, dest)
     
     return lfs
 
 
+def filesystem_image(lfs:LittleFS) -> memoryview:
+    '''
+        The raw filesystem image, without any copy.
+    '''
+    return memoryview(lfs.context.buffer)
+
+
 def write_filesystem(lfs:LittleFS, tmp_file:str):
     log.info(f'Writing LFS filesystem to {tmp_file.name}')
     tmp_file.write(lfs.context.buffer)
     tmp_file.close()
 
 
-def append_fs_to(uf2:UF2File, path_to_image:str, start_offset):
-    log.info(f'Injecting fs from {path_to_image} @ {hex(start_offset)}')
-    with open(path_to_image, 'rb') as img:
-        uf2.append_payload(img.read(), start_offset) 
+def append_fs_to(uf2:UF2File, image, start_offset):
+    '''
+        Append filesystem image to uf2, at start_offset.
+        @param image: path to an image file, or the image contents 
+        themselves (e.g. from filesystem_image())
+    '''
+    if not isinstance(image, str):
+        log.info(f'Injecting fs @ {hex(start_offset)}')
+        uf2.append_payload(image, start_offset)
+        return 
+    
+    log.info(f'Injecting fs from {image} @ {hex(start_offset)}')
+    with open(image, 'rb') as img:
+        uf2.append_payload(img, start_offset) 
     
 
     
+def fs_uf2_blocks(args, header:Header, cache:BlockCache=None) -> bytes:
+    '''
+        Encoded UF2 blocks for the entire filesystem region, using
+        header's flags and family.  When a cache is passed, these are 
+        only generated if the contents of fs_root, the LittleFS geometry 
+        or the block parameters have changed.
+    '''
+    offset = get_offset(args)
+    block_count = get_blockcount(args)
+    key = None
+    if cache is not None:
+        key = tree_digest(args.fs_root, 
+                          block_size=PicoUpythonFSBlocksize, 
+                          block_count=block_count, 
+                          prog_size=PicoUpythonFSProgSize,
+                          offset=offset,
+                          flags=header.flags,
+                          board_family=header.board_family,
+                          block_payload_size=DefaultBlockPayloadSize,
+                          magic=(Magic.START1, Magic.END))
+        encoded = cache.get(key)
+        if encoded is not None:
+            log.info(f'Using cached filesystem for {args.fs_root}')
+            return encoded
+    
+    lfs = prep_filesystem(args.fs_root, block_count)
+    out = io.BytesIO()
+    with UF2StreamWriter(out, header) as writer:
+        writer.write_payload(filesystem_image(lfs), offset, DefaultBlockPayloadSize)
+    encoded = out.getvalue()
+    
+    if cache is not None:
+        cache.put(key, encoded)
+    return encoded
+    
 def get_offset(args):
     v = 0
     if type(args.fs_offset) == int and args.fs_offset < 0:
@@ -154,9 +282,6 @@ def main():
     
     
     print(f"Prepping UF2 for {int(args.pico_flash / 1024**2)}M flash, with {args.fs_bytes / 1024**2:.2f}M for FS")
-    lfs = prep_filesystem(args.fs_root, get_blockcount(args))
-    tmp = tempfile.NamedTemporaryFile('wb', delete=False)
-    write_filesystem(lfs, tmp)
     
     log.info(f'Loading {args.upython}')
     try:
@@ -170,7 +295,18 @@ def main():
         
     uf2 = UF2File(args.upython, board_family=famid, 
                   fill_gaps=True)
-    append_fs_to(uf2, tmp.name, get_offset(args))
+    # gap padding only needed in the output, don't keep it around
+    uf2.pad_on_write = True
+    
+    cache = get_cache(args)
+    if cache is None:
+        lfs = prep_filesystem(args.fs_root, get_blockcount(args))
+        append_fs_to(uf2, filesystem_image(lfs), get_offset(args))
+    else:
+        fs_blocks = fs_uf2_blocks(args, uf2.header, cache)
+        for blk in iter_blocks(io.BytesIO(fs_blocks)):
+            uf2.append_datablock(blk)
+            
     uf2.to_file(args.out)
     
     print(f'Resulting UF2 file: {args.out}')
@@ -5,10 +5,11 @@ Created on Mar 14, 2024
 @copyright: Copyright (C) 2024 Pat Deegan, https://psychogenic.com
 '''
 
+import os
 import logging
 import argparse
 
-from uf2utils.file import UF2File
+from uf2utils.batch import run_batch
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
@@ -20,7 +21,7 @@ def get_args():
                         action='store_true',
                         help='pad any gaps in offsets with 0 bytes')
     parser.add_argument('--out', required=True,
-                                help='output file for contents')
+                                help='output file for contents (directory, with multiple inputs)')
     
     parser.add_argument('--offset_start', required=False, 
                                 default='0',
@@ -30,8 +31,11 @@ def get_args():
                                 default=None,
                                 help='restrict output to blocks below this offset')
     
-    parser.add_argument('infile', 
-                        help='UF2 input file')
+    parser.add_argument('--jobs', required=False, type=int, default=None,
+                        help='number of files to process concurrently')
+    
+    parser.add_argument('infile', nargs='+',
+                        help='UF2 input file(s)')
     
     return parser.parse_args()
 
@@ -47,30 +51,34 @@ def get_offset_value(vs:str):
 def main():
     args = get_args()
     
-    log.info(f'Loading {args.infile}')
-    uf2 = UF2File(args.infile)
-    uf2.sort_blocks() # force the payloads to be sorted
-    
-    if args.fill_gaps:
-        # fill in any gaps
-        uf2.generate_blocks_for_gaps()
-        
     off_start = get_offset_value(args.offset_start)
     off_end = None 
     if args.offset_end is not None:
         off_end = get_offset_value(args.offset_end)
         
-    # get the bytes
-    bts = uf2.extract_payload(off_start, off_end)
-    log.info(f'Extracted {len(bts)} bytes of payload')
-    with open(args.out, 'wb') as outfile:
-        outfile.write(bts)
-        
-    log.info(f'Wrote payload to {args.out}')
+    per_path = dict()
+    if len(args.infile) == 1:
+        per_path[args.infile[0]] = {'out_path': args.out}
+    else:
+        # one <name>.bin per input, in the out directory
+        os.makedirs(args.out, exist_ok=True)
+        for infile in args.infile:
+            name = os.path.splitext(os.path.basename(infile))[0] + '.bin'
+            per_path[infile] = {'out_path': os.path.join(args.out, name)}
+    
+    num_failed = 0
+    for res in run_batch('extract', args.infile, args.jobs, per_path=per_path,
+                         offset_start=off_start, offset_end=off_end, 
+                         fill_gaps=args.fill_gaps):
+        if res.ok:
+            log.info(f'Wrote payload of {res.path} to {res.value}')
+        else:
+            log.error(f'Could not extract {res.path}: {res.error}')
+            num_failed += 1
+            
+    if num_failed:
+        raise SystemExit(1)
         
     
 if __name__ == '__main__':
     main()
-    
-
-    
\ No newline at end of file
@@ -0,0 +1,49 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+Pack a directory into a file container UF2, or unpack one:
+
+python uf2utils/examples/file_container.py pack /tmp/assets --out /tmp/assets.uf2
+python uf2utils/examples/file_container.py unpack /tmp/assets.uf2 --out /tmp/assets_copy
+
+'''
+
+import logging
+import argparse
+
+from uf2utils.container import pack_directory, unpack_files
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='UF2 file containers')
+    parser.add_argument('action', choices=('pack', 'unpack'))
+    parser.add_argument('source',
+                        help='directory to pack, or UF2 to unpack')
+    parser.add_argument('--out', required=True,
+                        help='UF2 to create, or directory to unpack into')
+
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    if args.action == 'pack':
+        num_blocks = pack_directory(args.out, args.source)
+        log.info(f'Wrote {num_blocks} blocks to {args.out}')
+        return
+
+    num_files = 0
+    for name in unpack_files(args.source, args.out):
+        log.info(f'Extracting {name}')
+        num_files += 1
+    log.info(f'Extracted {num_files} files to {args.out}')
+
+if __name__ == '__main__':
+    main()
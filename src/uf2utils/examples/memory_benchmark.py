@@ -0,0 +1,146 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+Peak memory of loading a large UF2, in each of UF2File's modes, along
+with the per-block cost of DataBlock/Header objects, slotted or not.
+
+python uf2utils/examples/memory_benchmark.py --blocks 100000
+
+A UF2 of the requested size is generated in a temporary directory (or
+--uf2 given) and each mode is measured in a fresh interpreter, so none
+of them benefit from what another left behind.  Each run loads the
+file, then goes over every block's header and payload size, as uf2info
+would.  Figures are the tracemalloc peak (Python allocations, not the
+pages of a mapped file) and, on unix, the process' peak RSS.
+
+'''
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+from uf2utils.constants import Flags
+from uf2utils.header import Header
+from uf2utils.block import DataBlock
+from uf2utils.file import UF2File
+from uf2utils.stream import UF2StreamWriter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# mode name: UF2File constructor kwargs
+Modes = {
+    'eager': dict(),
+    'mmap': dict(use_mmap=True),
+    'lazy': dict(lazy=True),
+    'lazy+mmap': dict(lazy=True, use_mmap=True),
+}
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='UF2File memory use, by mode')
+    parser.add_argument('--blocks', required=False, type=int, default=100000,
+                        help='number of blocks in the generated UF2 [%(default)s]')
+    parser.add_argument('--uf2', required=False, default=None,
+                        help='use this UF2 rather than generating one')
+    parser.add_argument('--measure', required=False, default=None,
+                        choices=list(Modes.keys()),
+                        help=argparse.SUPPRESS)
+
+    return parser.parse_args()
+
+
+def generate(path:str, num_blocks:int):
+    hdr = Header(Flags.FamilyIDPresent, 0, 0, 0, 0, 0xe48bff56)
+    with UF2StreamWriter(path, hdr, num_blocks) as writer:
+        for i in range(num_blocks):
+            writer.write_block(0x10000000 + i * 256, i.to_bytes(4, 'little') * 64)
+
+
+def peak_rss_kib() -> int:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def measure(mode:str, path:str) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    uf2 = UF2File(path, **Modes[mode])
+    hdrs = uf2.header_index
+    total = 0
+    for idx in range(len(uf2)):
+        total += hdrs.payload_size[idx] + (hdrs.address[idx] & 1)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'mode': mode, 'blocks': len(uf2), 'peak': peak, 'rss_kib': peak_rss_kib()}
+
+
+def object_cost(num:int=100000) -> dict:
+    '''
+        Bytes per DataBlock+Header, for the real (slotted) classes and
+        subclasses that bring back a __dict__.
+    '''
+    class DictHeader(Header):
+        pass
+
+    class DictDataBlock(DataBlock):
+        pass
+
+    payload = bytes(256)
+    results = dict()
+    for name, hdr_cls, blk_cls in (('slotted', Header, DataBlock),
+                                   ('with __dict__', DictHeader, DictDataBlock)):
+        gc.collect()
+        tracemalloc.start()
+        blocks = [blk_cls(payload, hdr_cls(Flags.FamilyIDPresent, 0x10000000 + i * 256,
+                                           256, i, num, 0xe48bff56))
+                  for i in range(num)]
+        current, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = current / len(blocks)
+        del blocks
+    return results
+
+
+def main():
+    args = get_args()
+    if args.measure is not None:
+        print(json.dumps(measure(args.measure, args.uf2)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.uf2
+        if path is None:
+            path = os.path.join(tmp, 'benchmark.uf2')
+            generate(path, args.blocks)
+        size = os.path.getsize(path)
+        print(f'{path}: {size // 1024} KiB\n')
+
+        print(f"{'mode':<12}{'blocks':>10}{'peak (KiB)':>14}{'B/block':>10}{'peak RSS (KiB)':>16}")
+        for mode in Modes:
+            out = subprocess.run([sys.executable, __file__, '--measure', mode, '--uf2', path],
+                                 check=True, capture_output=True, text=True).stdout
+            res = json.loads(out.strip().splitlines()[-1])
+            per_block = res['peak'] / res['blocks'] if res['blocks'] else 0
+            rss = res['rss_kib'] if res['rss_kib'] is not None else '-'
+            print(f"{mode:<12}{res['blocks']:>10}{res['peak'] // 1024:>14}{per_block:>10.0f}{rss:>16}")
+
+    print('\nDataBlock + Header objects (shared payload):')
+    for name, cost in object_cost().items():
+        print(f'\t{name}: {cost:.0f} bytes per block')
+
+if __name__ == '__main__':
+    main()
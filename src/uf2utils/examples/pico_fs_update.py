@@ -19,11 +19,15 @@ python uf2utils/examples/custom_pico.py \
 '''
 import logging
 import argparse
-import tempfile
+import os
+import posixpath
 
+from littlefs import LittleFS, LittleFSError, LFSStat
 import uf2utils.constants as uf2const
 from uf2utils.family import Family
 from uf2utils.file import UF2File
+from uf2utils.header import Header
+from uf2utils.stream import UF2StreamWriter
 import uf2utils.examples.custom_pico as cust_pico
 
 logging.basicConfig(level=logging.INFO)
@@ -46,25 +50,183 @@ def get_args():
     parser.add_argument('--family', default=cust_pico.DefaultFamilyName, 
                         required=False,   
                         help=f"Chip family name [{cust_pico.DefaultFamilyName}]")
+    parser.add_argument('--fs_offset',
+                        default=-1, 
+                        required=False,   
+                        help="base offset in UF2 for filesystem -- only override if you know")
+    parser.add_argument('--block_count', default=-1,
+                        required=False,
+                        type=int,
+                        help='Block count for entire upython FS -- override if must, but calculated using pico-flash/hw-flash-storage')
+    parser.add_argument('--base', required=False,
+                        default=None,
+                        help='UF2 currently on the device: only emit the filesystem sectors that change relative to it')
+    cust_pico.add_cache_args(parser)
     
     return parser.parse_args()
 
+
+def load_filesystem(uf2:UF2File, offset:int, block_count:int):
+    '''
+        Mount the LittleFS within uf2, starting at offset, in memory.
+        
+        @return: tuple of (LittleFS, original image), or (None, None) if 
+        no valid filesystem is found
+    '''
+    image = uf2.read(offset, block_count * cust_pico.PicoUpythonFSBlocksize, fill=0xff)
+    lfs = LittleFS(block_size=cust_pico.PicoUpythonFSBlocksize, 
+                   block_count=block_count, 
+                   prog_size=cust_pico.PicoUpythonFSProgSize,
+                   mount=False)
+    lfs.context.buffer[:] = image
+    try:
+        lfs.mount()
+    except LittleFSError as e:
+        log.warning(f'No valid filesystem found @ {hex(offset)}: {e}')
+        return None, None
+    
+    return lfs, image
+
+
+def _lfs_stat(lfs:LittleFS, path:str):
+    try:
+        return lfs.stat(path)
+    except LittleFSError:
+        return None
+    
+def _lfs_same_contents(lfs:LittleFS, path:str, src_path:str) -> bool:
+    with lfs.open(path, 'rb') as lfs_file:
+        with open(src_path, 'rb') as src_file:
+            while True:
+                chunk = src_file.read(cust_pico.CopyChunkSize)
+                if chunk != lfs_file.read(len(chunk) or 1):
+                    return False
+                if not chunk:
+                    return True
+
+def _lfs_remove(lfs:LittleFS, path:str):
+    st = _lfs_stat(lfs, path)
+    if st is None:
+        return
+    if st.type == LFSStat.TYPE_DIR:
+        for name in lfs.listdir(path):
+            _lfs_remove(lfs, posixpath.join(path, name))
+    lfs.remove(path)
+
+def sync_filesystem(lfs:LittleFS, files_from_dir:str, to_base_dir:str='/') -> int:
+    '''
+        Bring the contents of lfs in line with files_from_dir: adding, 
+        updating and deleting only what differs.
+        
+        @return: number of changes made
+    '''
+    wanted = set()
+    num_changes = 0
+    for root, dir_names, file_names in os.walk(files_from_dir):
+        rel_dir = os.path.relpath(root, files_from_dir)
+        lfs_base = to_base_dir if rel_dir == '.' else posixpath.join(to_base_dir, *rel_dir.split(os.sep))
+        for new_dir in dir_names:
+            ndir = posixpath.join(lfs_base, new_dir)
+            wanted.add(ndir)
+            st = _lfs_stat(lfs, ndir)
+            if st is not None and st.type == LFSStat.TYPE_DIR:
+                continue
+            _lfs_remove(lfs, ndir)
+            log.info(f'mkdir {ndir}')
+            lfs.mkdir(ndir)
+            num_changes += 1
+            
+        for f in file_names:
+            src_path = os.path.join(root, f)
+            dest = posixpath.join(lfs_base, f)
+            wanted.add(dest)
+            st = _lfs_stat(lfs, dest)
+            if st is not None and st.type == LFSStat.TYPE_REG:
+                if st.size == os.path.getsize(src_path) and _lfs_same_contents(lfs, dest, src_path):
+                    continue
+                log.info(f'update {dest}')
+            else:
+                _lfs_remove(lfs, dest)
+                log.info(f'add {dest}')
+            cust_pico._copy_to_lfs(lfs, src_path, None, dest)
+            num_changes += 1
+    
+    stale = []
+    for root, dir_names, file_names in lfs.walk(to_base_dir):
+        for name in dir_names + file_names:
+            path = posixpath.join(root, name)
+            if path not in wanted:
+                stale.append(path)
+    
+    # deepest first, so directories are empty by the time we get to them
+    for path in sorted(stale, key=lambda p: p.count('/'), reverse=True):
+        log.info(f'rm {path}')
+        _lfs_remove(lfs, path)
+        num_changes += 1
+        
+    return num_changes
+
+
+def changed_sectors(old_image, new_image, sector_size:int) -> list:
+    '''
+        Indices of the sectors that differ between the two images.
+    '''
+    return [i // sector_size for i in range(0, len(new_image), sector_size) 
+                if old_image[i:i + sector_size] != new_image[i:i + sector_size]]
+
+
+def write_fs_delta(args, hdr:Header) -> bool:
+    '''
+        Apply changes in fs_root to the filesystem within the base 
+        UF2 and write out only the erase sectors that were modified.
+        
+        @return: False if base holds no usable filesystem
+    '''
+    offset = cust_pico.get_offset(args)
+    base = UF2File(args.base, lazy=True)
+    lfs, old_image = load_filesystem(base, offset, cust_pico.get_blockcount(args))
+    if lfs is None:
+        return False
+    
+    num_changes = sync_filesystem(lfs, args.fs_root)
+    sector_size = cust_pico.PicoUpythonFSBlocksize
+    new_image = cust_pico.filesystem_image(lfs)
+    sectors = changed_sectors(old_image, new_image, sector_size)
+    log.info(f'{num_changes} filesystem changes, {len(sectors)} sectors to update')
+    
+    with UF2StreamWriter(args.out, hdr) as writer:
+        for sector in sectors:
+            start = sector * sector_size
+            writer.write_payload(new_image[start:start + sector_size], offset + start)
+    return True
+
     
 def main():
     args = get_args()
     
-    lfs = cust_pico.prep_filesystem(args.fs_root, cust_pico.get_blockcount(args))
-    tmp = tempfile.NamedTemporaryFile('wb', delete=False)
-    cust_pico.write_filesystem(lfs, tmp)
-    
-    uf2 = UF2File()
-    uf2.header.flags = uf2const.Flags.FamilyIDPresent
-    uf2.header.family = Family.byName(args.family)
-    if uf2.header.family is None:
+    family = Family.byName(args.family)
+    if family is None:
         print(f"Invalid family '{args.family}'")
         return
-    cust_pico.append_fs_to(uf2, tmp.name, cust_pico.get_offset(args))
-    uf2.to_file(args.out)
+    
+    hdr = Header(uf2const.Flags.FamilyIDPresent, 0, 0, 0, 0, family.id)
+    if args.base is not None:
+        if write_fs_delta(args, hdr):
+            return
+        log.warning('Generating complete filesystem')
+        
+    cache = cust_pico.get_cache(args)
+    if cache is not None:
+        # the cached blocks are exactly what we need to output
+        with open(args.out, 'wb') as outfile:
+            outfile.write(cust_pico.fs_uf2_blocks(args, hdr, cache))
+        return
+    
+    lfs = cust_pico.prep_filesystem(args.fs_root, cust_pico.get_blockcount(args))
+    
+    # only the filesystem goes out, so just stream it straight through
+    with UF2StreamWriter(args.out, hdr) as writer:
+        writer.write_payload(cust_pico.filesystem_image(lfs), cust_pico.get_offset(args))
     
 if __name__ == '__main__':
     main()
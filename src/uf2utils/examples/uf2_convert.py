@@ -0,0 +1,80 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+Convert between UF2 and ELF, Intel HEX or raw binaries, by extension:
+
+uf2convert --family RP2040 --out /tmp/firmware.uf2 /tmp/firmware.elf
+uf2convert --family RP2040 --out /tmp/firmware.uf2 /tmp/firmware.hex
+uf2convert --family RP2040 --base 0x10000000 --out /tmp/firmware.uf2 /tmp/firmware.bin
+uf2convert --out /tmp/firmware.hex /tmp/firmware.uf2
+
+'''
+
+import logging
+import argparse
+import sys
+
+from uf2utils.family import Family
+from uf2utils.convert import convert, UF2ConvertError
+import uf2utils.examples.extract_binary as extract_binary
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Convert between UF2 and ELF, Intel HEX or BIN')
+    parser.add_argument('--out', required=True,
+                        help='output file (.uf2, .hex or .bin)')
+    parser.add_argument('--family', required=False, default=None,
+                        help='chip family name, when creating a UF2')
+    parser.add_argument('--base', required=False, default=None,
+                        help='load address of a .bin input or, for .bin output, of its first byte')
+    parser.add_argument('--fill', required=False, default='0',
+                        help='value for bytes not covered by the input [%(default)s]')
+    parser.add_argument('infile',
+                        help='input file (.elf, .hex, .bin or .uf2)')
+
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    board_family = None
+    if args.family is not None:
+        family = Family.byName(args.family)
+        if family is None:
+            print(f"Invalid family '{args.family}'")
+            sys.exit(1)
+        board_family = family.id
+
+    in_bin = args.infile.lower().endswith('.bin')
+    to_uf2 = args.out.lower().endswith('.uf2')
+    # to UF2, the family of all blocks.  From UF2, only that family's blocks
+    kwargs = {'board_family': board_family}
+    if in_bin or args.out.lower().endswith('.bin'):
+        if args.base is not None:
+            kwargs['base_address'] = extract_binary.get_offset_value(args.base)
+        elif in_bin:
+            print('A --base address is required for .bin inputs')
+            sys.exit(1)
+    if not in_bin and not args.out.lower().endswith(('.hex', '.ihex')):
+        kwargs['fill'] = extract_binary.get_offset_value(args.fill)
+
+    try:
+        num = convert(args.infile, args.out, **kwargs)
+    except UF2ConvertError as e:
+        print(f'Could not convert {args.infile}: {e}')
+        sys.exit(1)
+
+    if to_uf2:
+        log.info(f'Wrote {num} blocks to {args.out}')
+    else:
+        log.info(f'Wrote {num} bytes to {args.out}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+uf2diff /tmp/v1.uf2 /tmp/v2.uf2 --out /tmp/v1-to-v2.uf2
+
+'''
+
+import logging
+import argparse
+import sys
+
+from uf2utils.file import UF2File
+from uf2utils.diff import diff, delta
+
+logging.basicConfig(level=logging.WARN)
+log = logging.getLogger(__name__)
+
+# bytes shown per changed range, with --show-bytes
+ShowBytesMax = 32
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Compare UF2 contents by flash address')
+    parser.add_argument('--out', required=False, default=None,
+                        help='write a UF2 of only the blocks from newfile that differ')
+    parser.add_argument('--show-bytes', required=False, default=False,
+                        action='store_true',
+                        help=f'show (up to {ShowBytesMax}) old/new bytes for each range')
+    parser.add_argument('--quiet', required=False, default=False,
+                        action='store_true',
+                        help='only output the summary')
+    parser.add_argument('oldfile',
+                        help='original UF2')
+    parser.add_argument('newfile',
+                        help='modified UF2')
+
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    old = UF2File(args.oldfile, lazy=True, use_mmap=True)
+    new = UF2File(args.newfile, lazy=True, use_mmap=True)
+
+    # only the addresses are kept, the ranges' contents go as they come
+    new_ranges = []
+    num_ranges = 0
+    num_bytes = 0
+    for d in diff(old, new):
+        num_ranges += 1
+        num_bytes += d.size
+        if args.out is not None and d.new is not None:
+            new_ranges.append((d.address, d.end))
+        if args.quiet:
+            continue
+        print(f'{hex(d.address)} - {hex(d.end)}\t{d.kind} ({d.size} bytes)')
+        if args.show_bytes:
+            if d.old is not None:
+                print(f'\t- {d.old[:ShowBytesMax].hex(" ")}')
+            if d.new is not None:
+                print(f'\t+ {d.new[:ShowBytesMax].hex(" ")}')
+
+    print(f'{num_ranges} ranges differ, {num_bytes} bytes in all')
+
+    if args.out is not None:
+        out = delta(old, new, new_ranges)
+        out.to_file(args.out)
+        print(f'Wrote {len(out)} blocks to {args.out}')
+
+    # like diff, exit status reflects whether there were differences
+    sys.exit(1 if num_ranges else 0)
+
+if __name__ == '__main__':
+    main()
@@ -10,8 +10,9 @@ Created on Mar 14, 2024
 import logging
 import argparse
 
-from uf2utils.file import UF2File
 from uf2utils.family import Family
+from uf2utils.batch import run_batch
+from uf2utils.tags import TagType
 
 logging.basicConfig(level=logging.WARN)
 log = logging.getLogger(__name__)
@@ -19,72 +20,81 @@ log = logging.getLogger(__name__)
 
 def get_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument('infile', 
-                        help='UF2 input file')
+    parser.add_argument('--jobs', required=False, type=int, default=None,
+                        help='number of files to process concurrently')
+    parser.add_argument('--processes', required=False, default=False,
+                        action='store_true',
+                        help='use worker processes, rather than threads')
+    parser.add_argument('infile', nargs='+',
+                        help='UF2 input file(s)')
     
     return parser.parse_args()
 
 
-def main():
-    args = get_args()
-    uf2 = UF2File(args.infile, fill_gaps=False)
-    
-    uf2.sort_blocks()
-    # uf2.renumber_blocks()
+def print_info(info:dict):
+    num_blocks = info['num_blocks']
+    print('\n\nUF2 info')
+    print(f"File {info['path']}")
+    if not num_blocks:
+        print('Contains NO BLOCKS')
+        return 
     
-    payload_size = 0
-    all_have_family = True
-    all_flags = dict()
-    all_families = dict()
-    for blk in uf2:
-        payload_size += blk.header.payload_size
-        if blk.header.board_family:
-            if blk.header.board_family not in all_families:
-                all_families[blk.header.board_family] = Family.byId(blk.header.board_family)
-        else:
-            all_have_family = False
-        
-        if blk.header.flags not in all_flags:
-            all_flags[blk.header.flags] = 1
-        else: 
-            all_flags[blk.header.flags] += 1
+    print(f"\tspanning {hex(info['start'])} - {hex(info['end'])} in {num_blocks} blocks")
+    print(f"\tTotal payload size: {info['payload_size']} bytes")
+    if info['num_gap_blocks']:
+        print(f"\tCONTAINS GAPS: {info['num_gap_blocks']} must be generated to fill")
+    else:
+        print(f'\tContains NO gaps.')
         
-    num_blocks = len(uf2)
-    print('\n\nUF2 info')
-    print(f"File {args.infile}")
-    if num_blocks:
-        print(f"\tspanning {hex(uf2[0].header.address)} - {hex(uf2[-1].header.address)} in {num_blocks} blocks")
-        print(f'\tTotal payload size: {payload_size} bytes')
-        # uf2.generate_blocks_for_gaps()
-        num_blocks_after = len(uf2)
-        if num_blocks_after != num_blocks:
-            print(f'\tCONTAINS GAPS: {num_blocks_after - num_blocks} must be generated to fill')
-        else:
-            print(f'\tContains NO gaps.')
-        if len(all_families):
-            if all_have_family:
-                print('\tAll blocks have board family value')
-            else:
-                print('\tSome blocks have NO board family value')
-                
-            print('\tBoard family set:')
-            for id,fam in all_families.items():
-                if fam is not None:
-                    print(f'\t\t{fam.description}')
-                else:
-                    print(f'\t\tUnknown board family {hex(id)}')
+    all_families = dict((fam_id, Family.byId(fam_id)) for fam_id in info['families'] if fam_id)
+    if len(all_families):
+        if info['all_have_family']:
+            print('\tAll blocks have board family value')
         else:
-            print('\tBoard family NOT SET')
+            print('\tSome blocks have NO board family value')
             
+        print('\tBoard family set:')
+        for id,fam in all_families.items():
+            num_fam_blocks = info['families'][id]
+            if fam is not None:
+                print(f'\t\t{fam.description}: {num_fam_blocks} blocks')
+            else:
+                print(f'\t\tUnknown board family {hex(id)}: {num_fam_blocks} blocks')
+    else:
+        print('\tBoard family NOT SET')
         
-        print('\tFlags found')
-        for k,v in all_flags.items():
-            print(f'\t\t{hex(k)}: {v} blocks')
+    print('\tFlags found')
+    for k,v in info['flags'].items():
+        print(f'\t\t{hex(k)}: {v} blocks')
         
-    else:
-        print('Contains NO BLOCKS')
+    if len(info['tags']):
+        print('\tExtension tags')
+        for tag_type, value in info['tags'].items():
+            print(f'\t\t{TagType.name(tag_type)}: {value!r}')
+        
+    num_checksummed = info['num_checksummed']
+    if num_checksummed:
+        failed = info['checksum_failures']
+        if len(failed):
+            print(f'\tMD5 checksums FAILED for {len(failed)} of {num_checksummed} blocks')
+        else:
+            print(f'\tMD5 checksums OK for all {num_checksummed} blocks')
+            
+
+def main():
+    args = get_args()
+    # only header stats needed, files are opened lazily
+    num_failed = 0
+    for res in run_batch('info', args.infile, args.jobs, args.processes):
+        if res.ok:
+            print_info(res.value)
+        else:
+            print(f'\n\nUF2 info\nFile {res.path}\n\tFAILED: {res.error}')
+            num_failed += 1
         
     print('\n\n')
+    if num_failed:
+        raise SystemExit(1)
     
 if __name__ == '__main__':
     main()
@@ -0,0 +1,82 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+uf2merge --out /tmp/combined.uf2 \
+    /tmp/bootloader.uf2 /tmp/application.uf2 /tmp/fs.bin@0x100a0000
+
+Inputs are UF2 files, or raw binaries given as path@base_address.
+
+'''
+
+import logging
+import argparse
+import sys
+
+from uf2utils.family import Family
+from uf2utils.merge import UF2Merger, UF2MergeError, OverlapPolicy
+import uf2utils.examples.extract_binary as extract_binary
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Combine UF2 files and raw binaries into one UF2')
+    parser.add_argument('--out', required=True,
+                        help='output UF2 file')
+    parser.add_argument('--policy', required=False,
+                        default=OverlapPolicy.Error,
+                        choices=OverlapPolicy.All,
+                        help='what to do with overlapping inputs [%(default)s]')
+    parser.add_argument('--family', required=False, default=None,
+                        help='chip family name for raw binaries (defaults to that of first UF2)')
+    parser.add_argument('--fill_gaps', required=False, default=False,
+                        action='store_true',
+                        help='pad any gaps in offsets with 0 bytes')
+    parser.add_argument('inputs', nargs='+',
+                        help='UF2 files, or raw binaries as path@base_address')
+
+    return parser.parse_args()
+
+
+def main():
+    args = get_args()
+
+    board_family = None
+    if args.family is not None:
+        family = Family.byName(args.family)
+        if family is None:
+            print(f"Invalid family '{args.family}'")
+            sys.exit(1)
+        board_family = family.id
+
+    merger = UF2Merger(args.policy, board_family=board_family)
+    for inp in args.inputs:
+        if '@' in inp:
+            path, base = inp.rsplit('@', 1)
+            log.info(f'Adding binary {path} @ {base}')
+            merger.add_binary(path, extract_binary.get_offset_value(base))
+        else:
+            log.info(f'Adding {inp}')
+            merger.add_uf2(inp)
+
+    try:
+        uf2 = merger.merge()
+    except UF2MergeError as e:
+        print(f'{e}\nUse --policy to pick a winner for overlapping inputs')
+        sys.exit(1)
+
+    for start, end, names in merger.overlaps:
+        log.warning(f'Overlap {hex(start)} - {hex(end)}: {", ".join(names)}')
+
+    if args.fill_gaps:
+        uf2.fill_gaps = True
+        uf2.pad_on_write = True
+    uf2.to_file(args.out)
+    log.info(f'Wrote {len(uf2)} blocks to {args.out}')
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,31 @@ Created on Mar 13, 2024
 
 Based on https://github.com/microsoft/uf2/blob/master/utils/uf2families.json
 
+Families are looked up through id and (case-insensitive) name indexes,
+built on first use, and every lookup returns the same immutable
+instance.  More families may be loaded from files in the upstream
+uf2families.json format, either explicitly:
+
+    Family.load_json('/path/to/uf2families.json')
+
+or, lazily on first lookup, from every file listed (os.pathsep
+separated) in the UF2UTILS_FAMILIES environment variable (files that
+can't be read are logged and skipped).  Single families can also be
+added with Family.register().
 
 @author: Pat Deegan
 @copyright: Copyright (C) 2024 Pat Deegan, https://psychogenic.com
 '''
+import json
+import os
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+# os.pathsep separated list of uf2families.json files, loaded on first lookup
+FamiliesPathEnvVar = 'UF2UTILS_FAMILIES'
+
 FamilyDescriptions = [
   {
     'id': 0x16573617,
@@ -239,30 +260,149 @@ FamilyDescriptions = [
 ]
 
 class Family:
+    '''
+        A board family.  Instances are interned and immutable: get them 
+        through byId()/byName() (or register()) rather than constructing.
+    '''
+    __slots__ = ('id', 'name', 'description')
+    
+    _by_id = None
+    _by_name = None
+    _lock = threading.Lock()
     
     @classmethod
     def byId(cls, id:int):
-        for fam in FamilyDescriptions:
-            if fam['id'] == id:
-                return cls(fam['id'], fam['name'], fam['description'])
-            
-        return None
+        if cls._by_id is None:
+            cls._load()
+        return cls._by_id.get(id)
     
     @classmethod 
     def byName(cls, name:str):
-        for fam in FamilyDescriptions:
-            if fam['name'] == name:
-                return cls(fam['id'], fam['name'], fam['description'])
+        if cls._by_name is None:
+            cls._load()
+        return cls._by_name.get(name.lower())
+    
+    @classmethod 
+    def all(cls) -> list:
+        '''
+            Every known family, by id
+        '''
+        if cls._by_id is None:
+            cls._load()
+        return list(cls._by_id.values())
+    
+    @classmethod 
+    def register(cls, id:int, name:str, description:str=None):
+        '''
+            Add a family, or replace the one with that id or name.
+            
+            @return: the (interned) Family
+        '''
+        if cls._by_id is None:
+            cls._load()
+        with cls._lock:
+            return cls._add(cls._by_id, cls._by_name, id, name, description)
+    
+    @classmethod 
+    def load_json(cls, source) -> int:
+        '''
+            Register all the families in a uf2families.json style list 
+            (entries with "id", as an int or hex string, "short_name" 
+            or "name" and "description").
             
-        return None
+            @param source: path to, or text file object for, the JSON
+            @return: number of families loaded
+        '''
+        entries = cls._read_json(source)
+        for fam_id, name, description in entries:
+            cls.register(fam_id, name, description)
+        return len(entries)
+    
+    @classmethod 
+    def _read_json(cls, source) -> list:
+        '''
+            (id, name, description) of every entry in a uf2families.json
+        '''
+        if isinstance(source, str):
+            with open(source, 'r') as f:
+                entries = json.load(f)
+        else:
+            entries = json.load(source)
         
+        families = []
+        for entry in entries:
+            fam_id = entry['id']
+            if isinstance(fam_id, str):
+                fam_id = int(fam_id, 0)
+            families.append((fam_id, entry.get('short_name', entry.get('name')), 
+                             entry.get('description')))
+        return families
+    
+    @classmethod 
+    def _load(cls):
+        with cls._lock:
+            if cls._by_id is not None:
+                return 
+            by_id = dict()
+            by_name = dict()
+            for fam in FamilyDescriptions:
+                cls._add(by_id, by_name, fam['id'], fam['name'], fam['description'])
+                
+            paths = os.environ.get(FamiliesPathEnvVar)
+            for path in (paths.split(os.pathsep) if paths else []):
+                if not len(path):
+                    continue
+                log.debug(f'Loading families from {path}')
+                try:
+                    families = cls._read_json(path)
+                except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                    # same outcome on every lookup, rather than failing the first
+                    log.warning(f'Skipping families from {path}: {e}')
+                    continue
+                for fam_id, name, description in families:
+                    cls._add(by_id, by_name, fam_id, name, description)
+                    
+            # published last, so other threads never see a partial table
+            cls._by_name = by_name
+            cls._by_id = by_id
+    
+    @classmethod 
+    def _add(cls, by_id:dict, by_name:dict, id:int, name:str, description:str):
+        fam = cls(id, name, description if description is not None else name)
+        replaced = by_id.get(id)
+        if replaced is not None and by_name.get(replaced.name.lower()) is replaced:
+            del by_name[replaced.name.lower()]
+        replaced = by_name.get(name.lower())
+        if replaced is not None and by_id.get(replaced.id) is replaced:
+            del by_id[replaced.id]
+        by_id[id] = fam 
+        by_name[name.lower()] = fam
+        return fam 
     
     def __init__(self, id:int, name:str, description:str):
-        self.id = id 
-        self.name = name 
-        self.description = description
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'description', description)
+        
+    def __setattr__(self, name, value):
+        raise AttributeError(f'Family is immutable, cannot set {name}')
+    
+    def __delattr__(self, name):
+        raise AttributeError(f'Family is immutable, cannot delete {name}')
+        
+    def __reduce__(self):
+        # pickling (e.g. to worker processes) can't go through __setattr__
+        return (self.__class__, (self.id, self.name, self.description))
+
+    def __eq__(self, other):
+        if not isinstance(other, Family):
+            return NotImplemented
+        return self.id == other.id and self.name == other.name
+    
+    def __hash__(self):
+        return hash(self.id)
         
     def __repr__(self):
         return f'<Family {self.name} {hex(self.id)}>'
         
-        
\ No newline at end of file
+        
@@ -5,15 +5,23 @@ Created on Mar 13, 2024
 @copyright: Copyright (C) 2024 Pat Deegan, https://psychogenic.com
 '''
 import os
+import mmap
+import struct
 from uf2utils.constants import BlockSize, DefaultBlockPayloadSize, Flags, Magic
 from uf2utils.header import Header, UF2EncodeError, UF2DecodeError
-from uf2utils.block import DataBlock
+from uf2utils.block import DataBlock, zero_payload, unpack_md5, unpack_tags
+from uf2utils.tags import TagIndex, decode_tag
+from uf2utils.index import HeaderIndex, AddressIndex
+from uf2utils.stream import iter_chunks, iter_records
 from uf2utils.family import Family
 
 
 import logging 
 log = logging.getLogger(__name__)
 
+# readTag() header fields: flags, address, payload size 
+TagScanHeader = struct.Struct('<III')
+TagScanReadSize = BlockSize * 8
 
 
 class UF2File:
@@ -55,6 +63,14 @@ class UF2File:
     
     @classmethod 
     def setMagic(cls, start:int, end:int):
+        '''
+            Change the default magic values, process wide.
+            Prefer the magic_start/magic_end constructor parameters, 
+            which only apply to that file.
+            
+            Files without magic of their own pick up the new defaults 
+            for blocks appended or read from then on.
+        '''
         cls.setMarkerStart(start)
         cls.setMarkerEnd(end)
         
@@ -68,32 +84,94 @@ class UF2File:
         
     
     @classmethod 
-    def readBlocks(cls, filepath:str):
+    def readBlocks(cls, filepath:str, use_mmap:bool=False, magic:Magic=None):
+        '''
+            Read all blocks from filepath.
+            
+            @param use_mmap: if True, the file is memory-mapped and each 
+            block's payload is a memoryview slice of that single mapping. 
+            The mapping is copy-on-write, so payloads may be modified in 
+            place without affecting the file and nothing gets copied until
+            that happens.
+            @param magic: the file's magic values, if not the standard ones
+        '''
+        if use_mmap:
+            view = cls.readRaw(filepath, use_mmap=True)
+            return [DataBlock.fromBlock(view[i:i + BlockSize], i // BlockSize, magic) 
+                        for i in range(0, len(view), BlockSize)]
+        
+        cls._checkPath(filepath)
         blocks = []
+        with open(filepath, 'rb') as f:
+            for i, record in enumerate(iter_records(f)):
+                blocks.append(DataBlock.fromBlock(bytes(record), i, magic))
+
+        return blocks
+    
+    @classmethod 
+    def readRaw(cls, filepath:str, use_mmap:bool=False) -> memoryview:
+        '''
+            Get the raw contents of filepath as a (writable) memoryview, 
+            either through a copy-on-write memory mapping or by reading 
+            it all in with a single call.
+        '''
+        cls._checkPath(filepath)
+        size = os.path.getsize(filepath)
+        if size == 0:
+            # can't map an empty file
+            return memoryview(bytearray())
+        
+        with open(filepath, 'rb') as f:
+            if use_mmap:
+                # views of the mapping keep it alive, no need to hold on to it here
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY))
+            
+            data = bytearray(size)
+            f.readinto(data)
+            return memoryview(data)
+    
+    @classmethod 
+    def readTag(cls, filepath:str, tag_type:int):
+        '''
+            Value of the first tag_type extension tag in filepath (see 
+            tags.decode_tag), or None.  Only reads as far as required, so 
+            images tagged in their first blocks are quickly identified.
+        '''
+        cls._checkPath(filepath)
+        with open(filepath, 'rb') as f:
+            for record in iter_records(f, TagScanReadSize):
+                flags, _address, payload_size = TagScanHeader.unpack_from(record, 8)
+                if not flags & Flags.ExtensionTagsPresent:
+                    continue 
+                for found_type, raw in unpack_tags(record, flags, payload_size):
+                    if found_type == tag_type:
+                        return decode_tag(tag_type, raw)
+        return None
+    
+    @classmethod 
+    def _checkPath(cls, filepath:str):
         if not os.path.exists(filepath):
             raise UF2DecodeError(f'Cannot find {filepath}')
         if not os.path.isfile(filepath):
             raise UF2DecodeError(f'{filepath} not a file')
-            
-        with open(filepath, 'rb') as f:
-            while True:
-                data = f.read(BlockSize)
-                if data is not None and len(data):
-                    blocks.append(DataBlock.fromBlock(data))
-                else:
-                    break
-
-        return blocks
     
     def __init__(self, fpath:str='', board_family:int=None, 
                  fill_gaps:bool=False,
                  magic_start:int=None, 
-                 magic_end:int = None):
+                 magic_end:int = None,
+                 use_mmap:bool=False,
+                 lazy:bool=False):
         '''
             UF2File constructor
             @param fpath: path to file (will read in automatically, if passed)
             @param board_family: default board family id (will use from file, if read)
             @param fill_gaps: boolean, if true will ensure no gaps present on write
+            @param magic_start: START1 magic for this file, if not the standard one
+            @param magic_end: END magic for this file, if not the standard one
+            @param use_mmap: boolean, if true files are read through a memory 
+            mapping and block payloads are zero-copy memoryviews into it
+            @param lazy: boolean, if true only the headers are decoded on read
+            (see header_index) and DataBlocks are created as they are accessed
              
         
         '''
@@ -101,10 +179,10 @@ class UF2File:
             # set some sane default
             board_family = Family.byName('RP2040').id
             
-        self.magic_start1 = magic_start 
-        self.magic_end = magic_end
+        # magic values are specific to this file, leaving 
+        # any others being processed alongside it alone
+        self.magic = Magic(magic_start, magic_end)
         
-        self._setupMagic()
         # the uf2file header is a prototype for cases where we
         # are writing from scratch (i.e. no example to copy from 
         # a parsed in file)
@@ -116,6 +194,26 @@ class UF2File:
         self.cleanup_resort = False
         self.overwrite_prototype_header_on_read = True
         self.fill_gaps = fill_gaps
+        # when filling gaps, only generate the padding while writing out
+        self.pad_on_write = False
+        # gaps to be padded on write, when pad_on_write is set
+        self._pending_gaps = None
+        self.use_mmap = use_mmap
+        self.lazy = lazy
+        # memory mapped files block payloads may be views into: this
+        # file's own source and any others its blocks were copied from
+        self._mapped_paths = set()
+        # the file block records (DataBlock.record) refer to, if any
+        self._records_path = None
+        self._source = None
+        self._index = None
+        self._addr_index = None
+        self._family_index = None
+        self._tag_index = None
+        # number blocks within each board family (as separate images)
+        # rather than as one sequence.  None: only do so if the file
+        # holds more than one family
+        self.renumber_per_family = None
         
         
         if len(fpath):
@@ -129,6 +227,9 @@ class UF2File:
             UF2EncodeError('Can only append datablocks with a header')
         self._blocks.append(dblock)
         self._dirty = True 
+        self._pending_gaps = None
+        self._records_path = None
+        self.reindex()
         
     def append_payload(self, payload_bytes:bytes, start_offset:int, 
                        block_payload_size:int=DefaultBlockPayloadSize):
@@ -136,22 +237,14 @@ class UF2File:
             Append arbitrary binary payload, creating blocks and setting 
             offsets as required.
             
-            @param payload_bytes: actual contents to append
+            @param payload_bytes: actual contents to append, either bytes-like,
+            a binary file object or an iterable of byte chunks
             @param start_offset: offset start point for this content
             @param block_payload_size: if payload_bytes len > block size, will
             be split into multiple blocks
         '''
-        pcount = 0
         cur_offset = start_offset
-        while pcount < len(payload_bytes):
-            end_count = pcount + block_payload_size
-            
-            if end_count > len(payload_bytes):
-                end_count = len(payload_bytes)
-                
-            
-            bts = payload_bytes[pcount:end_count]
-            
+        for bts in iter_chunks(payload_bytes, block_payload_size):
             hdr = Header.deep_copy(self.header)
             hdr.block_number = self.num_blocks
             hdr.payload_size = len(bts)
@@ -161,8 +254,6 @@ class UF2File:
                                                 magic_start1=self.magic_start1,
                                                 magic_end=self.magic_end))
             
-            pcount = end_count
-            
         
     @property 
     def header(self) -> Header:
@@ -177,11 +268,219 @@ class UF2File:
         '''
         return self._header
     
+    @property 
+    def header_index(self) -> HeaderIndex:
+        '''
+            Columnar index of all block headers (addresses, sizes, flags...)
+            
+            For lazy files, this comes straight from the raw file data 
+            and does not require any DataBlock objects.
+            
+            @note: changes made directly to blocks' headers (rather 
+            than through this object's methods) are not tracked here, 
+            call reindex() after any such changes.
+        '''
+        if self._index is None:
+            self._index = HeaderIndex.fromBlocks(self)
+        return self._index
+    
+    @property 
+    def address_index(self) -> AddressIndex:
+        '''
+            Index of the blocks sorted by address, for fast lookups.
+            
+            @note: as with header_index, call reindex() after 
+            changing block headers directly.
+        '''
+        if self._addr_index is None:
+            self._addr_index = AddressIndex.fromHeaderIndex(self.header_index)
+        return self._addr_index
+    
+    @property 
+    def family_index(self) -> dict:
+        '''
+            Block indices for each board family id found, in order 
+            of first appearance (blocks without Flags.FamilyIDPresent
+            under None).
+            
+            @note: as with header_index, call reindex() after 
+            changing block headers directly.
+        '''
+        if self._family_index is None:
+            self._family_index = self.header_index.family_records()
+        return self._family_index
+    
+    @property 
+    def tag_index(self) -> TagIndex:
+        '''
+            All the extension tags in the file, by type.  For lazy 
+            files, these are found in the raw data without building
+            the blocks.
+            
+            @note: as with header_index, call reindex() after 
+            changing block tags directly.
+        '''
+        if self._tag_index is None:
+            tag_index = TagIndex()
+            hdrs = self.header_index
+            for idx in range(self.num_blocks):
+                flags = hdrs.flags[idx]
+                if not flags & Flags.ExtensionTagsPresent:
+                    continue 
+                if self._source is not None and self._blocks[idx] is None:
+                    found = unpack_tags(self._source, flags, hdrs.payload_size[idx], idx * BlockSize)
+                else:
+                    found = (self._blocks[idx].tags or dict()).items()
+                for tag_type, raw in found:
+                    tag_index.add(idx, tag_type, raw)
+            self._tag_index = tag_index
+        return self._tag_index
+    
+    @property 
+    def families(self) -> list:
+        '''
+            All the board family ids in the file (None standing 
+            for blocks without one)
+        '''
+        return list(self.family_index.keys())
+    
+    def family_blocks(self, family_id:int):
+        '''
+            Generator of the blocks for one board family. These 
+            are new DataBlocks, with their own headers, sharing 
+            payloads with the blocks of this file.
+        '''
+        for idx in self.family_index.get(family_id, []):
+            if self._source is not None and self._blocks[idx] is None:
+                # don't bother keeping the block within this file
+                blk = self._decode_block(idx)
+                blk.record = None
+                yield blk
+            else:
+                yield self._blocks[idx].copy()
+    
+    def for_family(self, family_id:int) -> 'UF2File':
+        '''
+            A UF2File holding only the blocks of one board family, 
+            as a logical image of its own (payloads are shared).
+        '''
+        uf2 = UF2File(board_family=family_id, 
+                      magic_start=self.magic_start1, 
+                      magic_end=self.magic_end)
+        uf2.fill_gaps = self.fill_gaps
+        uf2.pad_on_write = self.pad_on_write
+        uf2.add_mapped_source(self)
+        for blk in self.family_blocks(family_id):
+            if not uf2.num_blocks:
+                uf2.header.flags = blk.header.flags 
+                uf2.header.address = blk.header.address
+            uf2._blocks.append(blk)
+        uf2._dirty = True
+        return uf2
+    
+    def add_mapped_source(self, source):
+        '''
+            Note that block payloads may be views into source's memory 
+            mapping, so to_file() won't overwrite it from under them.
+            
+            @param source: a UF2File blocks were copied from, or the 
+            path of a memory mapped file
+        '''
+        if isinstance(source, UF2File):
+            self._mapped_paths.update(source._mapped_paths)
+        else:
+            self._mapped_paths.add(source)
+    
+    def split_families(self) -> dict:
+        '''
+            @return: dict of family id: UF2File, for each family present
+        '''
+        return dict((fam, self.for_family(fam)) for fam in self.families)
+    
+    def reindex(self):
+        '''
+            Drop the header, address, family and tag indexes, they'll 
+            be rebuilt on demand.
+        '''
+        self._index = None 
+        self._addr_index = None
+        self._family_index = None
+        self._tag_index = None
+        
+    def block_payload(self, idx:int):
+        '''
+            Payload of block idx.  For lazy files, blocks not yet built 
+            stay that way and this is just a view of the raw data.
+        '''
+        if self._source is not None and self._blocks[idx] is None:
+            start = idx * BlockSize + 32
+            return self._source[start:start + self.header_index.payload_size[idx]]
+        return self[idx].payload 
+    
+    def block_md5(self, idx:int) -> tuple:
+        '''
+            The (address, length, digest) checksum of block idx, 
+            or None if it has none.  As with block_payload, lazy 
+            files get this straight from the raw data.
+        '''
+        if self._source is not None and self._blocks[idx] is None:
+            if not self.header_index.flags[idx] & Flags.MD5ChecksumPresent:
+                return None
+            return unpack_md5(self._source, idx * BlockSize)
+        blk = self[idx]
+        if not blk.header.flags & Flags.MD5ChecksumPresent:
+            return None
+        return blk.md5
+    
+    def block_at(self, address:int) -> DataBlock:
+        '''
+            Get the block covering address, or None.
+        '''
+        idx = self.address_index.find(address)
+        if idx is None:
+            return None 
+        return self[idx]
+    
+    def read(self, address:int, length:int, fill:int=0) -> bytearray:
+        '''
+            Read exactly length bytes starting at address, from 
+            whichever blocks cover that range (including partial blocks).
+            
+            @param fill: value for any bytes not covered by a block
+            @return: bytearray of length bytes
+        '''
+        end = address + length
+        result = bytearray([fill]) * length if fill else bytearray(length)
+        for idx in self.address_index.overlapping(address, end):
+            blk = self[idx]
+            blk_start = blk.header.address
+            src_from = max(address, blk_start) - blk_start 
+            src_to = min(end, blk_start + len(blk.payload)) - blk_start
+            dest = blk_start + src_from - address
+            result[dest:dest + src_to - src_from] = blk.payload[src_from:src_to]
+        return result
+    
     @property 
     def num_blocks(self):
         return len(self._blocks)
     
     
+    @property 
+    def magic_start1(self) -> int:
+        return self.magic.start1 
+    
+    @magic_start1.setter 
+    def magic_start1(self, set_to:int):
+        self.magic.start1 = set_to 
+        
+    @property 
+    def magic_end(self) -> int:
+        return self.magic.end 
+    
+    @magic_end.setter 
+    def magic_end(self, set_to:int):
+        self.magic.end = set_to 
+        
     @property 
     def flags(self):
         return self.header.flags 
@@ -214,29 +513,88 @@ class UF2File:
             data from file_path.
         
         '''
-        self._setupMagic()
-        blks = self.readBlocks(file_path)
+        if self.lazy:
+            self._source = self.readRaw(file_path, self.use_mmap)
+            self._index = HeaderIndex.fromBuffer(self._source)
+            blks = [None] * len(self._index)
+            first_header = self._index.header(0)
+        else:
+            self._source = None
+            self._index = None
+            blks = self.readBlocks(file_path, self.use_mmap, self.magic)
+            first_header = blks[0].header
+            
         if self.overwrite_prototype_header_on_read:
-            self.header.address = blks[0].header.address 
-            self.header.flags = blks[0].header.flags 
-            self.header.board_family = blks[0].header.board_family 
+            self.header.address = first_header.address 
+            self.header.flags = first_header.flags 
+            self.header.board_family = first_header.board_family 
             
         self.header.total_blocks = len(blks)
         
         self._blocks = blks
         
         self._fpath = file_path
-        
-    def renumber_blocks(self):
+        self._payload = None
+        self._pending_gaps = None
+        self._addr_index = None
+        self._family_index = None
+        self._tag_index = None
+        self._mapped_paths = set([file_path]) if self.use_mmap else set()
+        self._records_path = file_path
+        
+    def renumber_blocks(self, per_family:bool=None):
         '''
             Blocks have both a number and a total, which 
             must be correct for things to work out.
             This method renumbers everything.
+            
+            When blocks for multiple board families are bundled 
+            in one file, each family's blocks are numbered as a 
+            sequence of their own (as though the images were 
+            concatenated), which is what bootloaders, ignoring 
+            the blocks of other families, expect.
+            
+            @param per_family: force (or prevent) per-family numbering,
+            defaults to renumber_per_family 
         '''
-        num_total = self.num_blocks
-        for i in range(0, num_total):
-            self._blocks[i].header.block_number = i
-            self._blocks[i].header.total_blocks = num_total 
+        self._materialize()
+        self.reindex()
+        if not self._numbered_per_family(per_family):
+            num_total = self.num_blocks
+            for i in range(0, num_total):
+                self._blocks[i].header.block_number = i
+                self._blocks[i].header.total_blocks = num_total 
+            return 
+        
+        totals = dict()
+        for blk in self._blocks:
+            fam = self._numbering_family(blk.header)
+            totals[fam] = totals.get(fam, 0) + 1
+        
+        counts = dict.fromkeys(totals, 0)
+        for blk in self._blocks:
+            hdr = blk.header
+            fam = self._numbering_family(hdr)
+            hdr.block_number = counts[fam]
+            hdr.total_blocks = totals[fam]
+            counts[fam] += 1
+            
+    @classmethod 
+    def _numbering_family(cls, hdr:Header):
+        # the field only holds a family when flagged as such (file 
+        # containers, for instance, use it for the file size)
+        if hdr.flags & Flags.FamilyIDPresent:
+            return hdr.board_family 
+        return None
+            
+    def _numbered_per_family(self, per_family:bool=None) -> bool:
+        if per_family is None:
+            per_family = self.renumber_per_family
+        if per_family is not None:
+            return per_family
+        
+        # family_index groups blocks as _numbering_family() does
+        return len(self.family_index) > 1
     
     def generate_blocks_for_gaps(self):
         '''
@@ -254,43 +612,134 @@ class UF2File:
             
             @see: sort_blocks()
         '''
+        gaps = self.find_gaps()
+        if not len(gaps):
+            return 
+        
+        self._materialize()
         all_blocks = []
-        for i in range(0, len(self) - 1):
-            cur_block = self[i]
-            next_block = self[i+1]
-            
-            all_blocks.append(cur_block)
-            if (cur_block.header.address + cur_block.header.payload_size) < next_block.header.address:
-                log.info(f'Empty space found between {cur_block}  and {next_block}, fill_gaps enabled')
-                log.info(f'{next_block.header.address - cur_block.header.address} bytes to pad in {cur_block.header.payload_size} byte chunks')
-            while (cur_block.header.address + cur_block.header.payload_size) < next_block.header.address:
-                hdr = Header.deep_copy(cur_block.header)
-                hdr.address = cur_block.header.address + cur_block.header.payload_size
-                hdr.block_number = cur_block.header.block_number + 1
-                log.debug(hdr)
-                empty_payload = bytearray(cur_block.header.payload_size)
-                cur_block = DataBlock(empty_payload, hdr)
-                all_blocks.append(cur_block)
-                #print(len(all_blocks), end='')
+        last_idx = 0
+        for after_idx, start_address, num_pad, pad_size in gaps:
+            all_blocks.extend(self._blocks[last_idx:after_idx + 1])
+            last_idx = after_idx + 1
+            all_blocks.extend(self._padding_blocks(self._blocks[after_idx].header, 
+                                                   start_address, num_pad, pad_size))
                 
-        if (len(self) > 1):
-            all_blocks.append(self[-1]) # last block
-        
+        all_blocks.extend(self._blocks[last_idx:])
         self._blocks = all_blocks
+        self.reindex()
         
+    def find_gaps(self) -> list:
+        '''
+            Locate all the holes between (sorted) blocks, in a single pass.
+            
+            @return: a list of (after_block_index, start_address, num_blocks, block_size)
+            tuples, describing the padding blocks required to fill each gap
+        '''
+        if self._source is not None and self._index is not None:
+            # nothing built yet, the index is current
+            addresses = self._index.address 
+            sizes = self._index.payload_size
+        else:
+            addresses = [blk.header.address for blk in self]
+            sizes = [blk.header.payload_size for blk in self]
+            
+        gaps = []
+        total_pad = 0
+        for i in range(len(addresses) - 1):
+            block_end = addresses[i] + sizes[i]
+            next_address = addresses[i + 1]
+            if block_end >= next_address:
+                continue
+            pad_size = sizes[i]
+            if not pad_size:
+                log.warning(f'Gap after empty block {i} @ {hex(addresses[i])} cannot be padded')
+                continue
+            
+            num_pad = -(-(next_address - block_end) // pad_size)
+            log.debug('Gap of %d bytes @ 0x%x, %d blocks of %d bytes', 
+                      next_address - block_end, block_end, num_pad, pad_size)
+            gaps.append((i, block_end, num_pad, pad_size))
+            total_pad += num_pad
+            
+        if len(gaps):
+            log.info(f'Found {len(gaps)} gaps, requiring {total_pad} empty blocks to fill')
+        return gaps
+    
+    def _padding_blocks(self, after_header:Header, start_address:int, num_pad:int, pad_size:int):
+        '''
+            Generate num_pad empty blocks, modeled on after_header.
+            All of them share the same immutable zero-filled payload.
+        '''
+        empty_payload = zero_payload(pad_size)
+        # no checksum or tags of their own
+        flags = after_header.flags & ~(Flags.MD5ChecksumPresent | Flags.ExtensionTagsPresent)
+        for j in range(num_pad):
+            hdr = Header(flags, start_address + j * pad_size, 
+                         pad_size, after_header.block_number + 1 + j, 
+                         after_header.total_blocks, after_header.board_family)
+            yield DataBlock(empty_payload, hdr, 
+                            magic_start1=self.magic.start1, magic_end=self.magic.end)
+            
+    def iter_with_gaps_filled(self, gaps:list=None):
+        '''
+            Iterate over all (sorted) blocks, generating the padding 
+            blocks for any gaps on the fly rather than storing them.
+            
+            @param gaps: as returned by find_gaps(), if already known
+        '''
+        if gaps is None:
+            gaps = self.find_gaps()
+        last_idx = 0
+        for after_idx, start_address, num_pad, pad_size in gaps:
+            for i in range(last_idx, after_idx + 1):
+                yield self[i]
+            last_idx = after_idx + 1
+            yield from self._padding_blocks(self[after_idx].header, 
+                                            start_address, num_pad, pad_size)
+        for i in range(last_idx, self.num_blocks):
+            yield self[i]
+            
     def sort_blocks(self):
         '''
             Does what it says on the box.  Blocks will be sorted according to their (header) address 
         '''
+        self._materialize()
+        self.reindex()
         sorted_blocks = sorted(self._blocks, key=lambda b: b.header.address)
         self._blocks = sorted_blocks 
+        num_overlapping = sum(1 for i in range(1, len(sorted_blocks)) 
+                    if sorted_blocks[i].header.address < 
+                        sorted_blocks[i - 1].header.address + sorted_blocks[i - 1].header.payload_size)
+        if num_overlapping:
+            # these are kept, as is.  See uf2utils.merge to resolve them
+            log.warning(f'{num_overlapping} blocks overlap their predecessor')
+        
+    def _release_mapping(self):
+        '''
+            Copy any payloads still living in the memory mapped 
+            file, so the source may safely be overwritten.
+        '''
+        self._materialize()
+        for blk in self._blocks:
+            if isinstance(blk.payload, memoryview):
+                blk.payload = bytes(blk.payload)
+        self._mapped_paths = set()
+        
+    def _materialize(self):
+        '''
+            Create any DataBlocks not yet built from the raw source.
+        '''
+        if self._source is None:
+            return 
+        for i in range(len(self._blocks)):
+            if self._blocks[i] is None:
+                self._blocks[i] = self._decode_block(i)
+        self._source = None
+        
+    def _decode_block(self, idx:int) -> DataBlock:
+        return DataBlock.fromBlock(self._source[idx * BlockSize:(idx + 1) * BlockSize], idx, self.magic)
         
-    def _setupMagic(self):
-        if self.magic_start1 is not None:
-            self.setMarkerStart(self.magic_start1)
-        if self.magic_end is not None:
-            self.setMarkerEnd(self.magic_end)
-            
     def _cleanup(self):
         if self.fill_gaps or self.cleanup_resort:
             self.sort_blocks()
@@ -298,26 +747,174 @@ class UF2File:
         self.renumber_blocks()
 
         if self.fill_gaps:
-            self.generate_blocks_for_gaps()
-            self.renumber_blocks()
+            if self.pad_on_write and not self._numbered_per_family():
+                # padding is numbered as a single sequence, on the fly
+                self._pending_gaps = self.find_gaps()
+            else:
+                self.generate_blocks_for_gaps()
+                self.renumber_blocks()
             
-    def to_file(self, file_path:str):
+    def finalize(self):
+        '''
+            Get blocks ready for output, if anything changed: sorting, 
+            gap filling and renumbering, as configured. 
+            Called automatically by to_file().
+        '''
+        if self._dirty:
+            self._cleanup()
+            self._dirty = False
+            
+    def to_file(self, file_path:str, use_mmap:bool=False):
         '''
             Generate a valid UF2 file based on current set of blocks.
             
             This may lead to renumbering of blocks and setting 
             total as required.
+            
+            All blocks are encoded into a single buffer and written 
+            out in one go or, if use_mmap is set, encoded directly 
+            into the memory mapped output file.
         '''
         self._fpath = file_path
-        if self._dirty:
-            self._cleanup()
-            self._dirty = False
+        self.finalize()
+        
+        if os.path.exists(file_path) and any(os.path.exists(mapped) and 
+                        os.path.samefile(file_path, mapped) for mapped in self._mapped_paths):
+            # truncating a file we have mapped would pull the rug 
+            # out from under all the payload views
+            self._release_mapping()
+            
+        size = self._num_output_blocks() * BlockSize
+        with open(file_path, 'w+b' if use_mmap else 'wb') as f:
+            if not use_mmap or not size:
+                f.write(self.encode())
+            else:
+                f.truncate(size)
+                with mmap.mmap(f.fileno(), size) as out:
+                    self.encode_into(out)
+                    out.flush()
+                
+        self._relocate_records(file_path)
+        
+    def _relocate_records(self, file_path:str):
+        '''
+            After writing out file_path, point block records at their
+            position in it, unless padding generated on the fly 
+            shifted things around.
+        '''
+        self._records_path = None
+        if self._pending_gaps is not None and len(self._pending_gaps):
+            return 
+        for i, blk in enumerate(self._blocks):
+            if blk is not None:
+                blk.record = i
+        self._records_path = file_path
+                
+    def update_in_place(self, file_path:str=None, blocks=None) -> int:
+        '''
+            Rewrite only the changed blocks of the file these were read from,
+            leaving every other 512 byte record alone.  Suitable for same-size
+            edits: payload changes within blocks, flags, family etc.
+            
+            @param file_path: file to update, defaults to the one read 
+            @param blocks: optional indices (or DataBlocks) known to have changed.
+            If not specified, every block is compared to its record in the file
+            (blocks never accessed in lazy mode are skipped).
+            @return: number of blocks rewritten
+        '''
+        if file_path is None:
+            file_path = self._fpath
+        
+        if self._records_path is None or not os.path.exists(file_path) \
+            or not os.path.samefile(file_path, self._records_path):
+            raise UF2EncodeError(f'Blocks were not read from (or last written to) {file_path}, in-place update impossible (use to_file)')
+        
+        num_records = os.path.getsize(file_path) // BlockSize
+        if self._dirty or num_records != self.num_blocks:
+            raise UF2EncodeError('Blocks added or removed, in-place update impossible (use to_file)')
+        
+        if blocks is None:
+            candidates = [blk for blk in self._blocks if blk is not None]
+        else:
+            candidates = [b if isinstance(b, DataBlock) else self[b] for b in blocks]
             
-        with open(file_path, 'wb') as f:
-            for blk in self._blocks:
-                f.write(blk.as_bytes)
-            f.close()
+        own_blocks = set(id(blk) for blk in self._blocks if blk is not None)
+        seen_records = set()
+        for blk in candidates:
+            if blk.record is None or blk.record >= num_records or id(blk) not in own_blocks:
+                raise UF2EncodeError(f'{blk} has no record in {file_path}')
+            if blk.record in seen_records:
+                raise UF2EncodeError(f'Several blocks claim record {blk.record} of {file_path}')
+            seen_records.add(blk.record)
+        
+        if not len(candidates):
+            return 0
+        
+        candidates.sort(key=lambda b: b.record)
+        num_written = 0
+        encoded = bytearray(BlockSize)
+        with open(file_path, 'r+b') as f:
+            current = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if blocks is None else None
+            try:
+                for blk in candidates:
+                    pos = blk.record * BlockSize
+                    blk.pack_into(encoded, 0)
+                    if current is not None and current[pos:pos + BlockSize] == encoded:
+                        continue
+                    f.seek(pos)
+                    f.write(encoded)
+                    num_written += 1
+            finally:
+                if current is not None:
+                    current.close()
+                
+        log.info(f'Updated {num_written} blocks in {file_path}')
+        return num_written 
+    
+    def encode(self) -> bytearray:
+        '''
+            Encode all blocks, as they stand, into a single buffer.
             
+            @note: unlike to_file(), this does no cleanup (renumbering etc)
+        '''
+        target = bytearray(self._num_output_blocks() * BlockSize)
+        self.encode_into(target)
+        return target 
+    
+    def encode_into(self, target, offset:int=0):
+        '''
+            Encode all blocks into a preallocated, writable, buffer 
+            (bytearray, mmap...) of at least num_blocks*BlockSize bytes 
+            past offset.
+        '''
+        num_total = self._num_output_blocks()
+        if len(target) - offset < num_total * BlockSize:
+            raise UF2EncodeError(f'Target too small to hold {num_total} blocks')
+        
+        for blk in self.iter_output_blocks():
+            blk.pack_into(target, offset)
+            offset += BlockSize
+
+    def iter_output_blocks(self):
+        '''
+            Iterate over the blocks as they are encoded, including any
+            padding left pending by finalize() (numbered on the way).
+        '''
+        if self._pending_gaps is None:
+            yield from self
+            return
+
+        # padding generated as we go, numbering everything on the way
+        num_total = self._num_output_blocks()
+        for i, blk in enumerate(self.iter_with_gaps_filled(self._pending_gaps)):
+            blk.header.block_number = i
+            blk.header.total_blocks = num_total
+            yield blk
+
+    def _num_output_blocks(self):
+        if self._pending_gaps is None:
+            return self.num_blocks
+        return self.num_blocks + sum(g[2] for g in self._pending_gaps)
         
     def extract_payload(self, offset_start:int=0, offset_end:int=None):
         '''
@@ -328,20 +925,9 @@ class UF2File:
             
             @return: a bytearray of the payload
         '''
-        sorted_blocks = sorted(self._blocks, key=lambda b: b.header.address)
-        included_blocks = []
-        for blk in sorted_blocks:
-            if blk.header.address < offset_start:
-                continue 
-            
-            if offset_end is not None and blk.header.address >= offset_end:
-                continue 
-            
-            included_blocks.append(blk)
-            
         bts = bytearray()
-        for blk in included_blocks:
-            bts += blk.payload
+        for idx in self.address_index.starting_in(offset_start, offset_end):
+            bts += self[idx].payload
         return bts
         
     @property 
@@ -375,7 +961,15 @@ class UF2File:
         if idx >= self.num_blocks:
             raise IndexError(f'Only have {self.num_blocks} blocks available')
         
-        return self._blocks[idx]
+        blk = self._blocks[idx]
+        if blk is None:
+            blk = self._decode_block(idx % self.num_blocks)
+            self._blocks[idx] = blk
+        return blk
+    
+    def __iter__(self):
+        for i in range(self.num_blocks):
+            yield self[i]
     
     def __repr__(self):
         return f'<UF2File {self._fpath} {self.num_blocks} blocks>'
@@ -0,0 +1,266 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+A sparse, address-level, view of flash contents.
+
+The FlashImage sits on top of a UF2File and records writes and erases
+as address ranges, layered over the original blocks (which are never
+touched).  When turned back into a UF2, only the blocks overlapping
+those changes are regenerated, everything else is carried over as is.
+
+    img = FlashImage(UF2File('/tmp/firmware.uf2'))
+    img.write(0x100ff000, config_bytes)
+    img.erase(0x10100000, 4096)
+    img.to_uf2().to_file('/tmp/patched.uf2')
+
+'''
+import bisect
+import heapq
+from uf2utils.constants import DefaultBlockPayloadSize, Flags
+from uf2utils.header import Header
+from uf2utils.block import DataBlock
+from uf2utils.file import UF2File
+
+
+class FlashImage:
+    '''
+        Sparse flash contents: a (possibly empty) base UF2File plus
+        an overlay of written and erased address ranges.
+    '''
+    def __init__(self, uf2:UF2File=None, block_payload_size:int=None):
+        '''
+            @param uf2: optional base contents
+            @param block_payload_size: payload size for regenerated blocks,
+            defaults to that of the base's first block
+        '''
+        if block_payload_size is None:
+            block_payload_size = DefaultBlockPayloadSize
+            if uf2 is not None and len(uf2):
+                block_payload_size = uf2.header_index.payload_size[0] or block_payload_size
+        self.uf2 = uf2
+        self.block_payload_size = block_payload_size
+        # overlay: sorted, non-overlapping ranges, data is None when erased
+        self._starts = []
+        self._ends = []
+        self._data = []
+
+    def write(self, address:int, data):
+        '''
+            Write data at address, superseding anything there.
+        '''
+        if len(data):
+            self._overlay(address, address + len(data), bytearray(data))
+
+    def erase(self, address:int, length:int):
+        '''
+            Remove any contents in [address, address+length)
+        '''
+        if length > 0:
+            self._overlay(address, address + length, None)
+
+    def read(self, address:int, length:int, fill:int=0) -> bytearray:
+        '''
+            Read exactly length bytes from address.
+
+            @param fill: value for any bytes with no contents
+        '''
+        end = address + length
+        if self.uf2 is not None:
+            result = self.uf2.read(address, length, fill)
+        else:
+            result = bytearray([fill]) * length if fill else bytearray(length)
+
+        for i in range(*self._overlapping(address, end)):
+            start = max(address, self._starts[i])
+            stop = min(end, self._ends[i])
+            data = self._data[i]
+            if data is None:
+                result[start - address:stop - address] = bytes([fill]) * (stop - start)
+            else:
+                offset = self._starts[i]
+                result[start - address:stop - address] = data[start - offset:stop - offset]
+        return result
+
+    def ranges(self, start:int=0, end:int=None) -> list:
+        '''
+            The [start, end) address ranges that actually hold content,
+            within the optional bounds.
+        '''
+        if end is None:
+            end = max(self._ends[-1] if len(self._ends) else 0, self._base_end())
+        return self._covered(start, end)
+
+    @property
+    def num_changes(self):
+        return len(self._starts)
+
+    def to_uf2(self) -> UF2File:
+        '''
+            Produce a UF2File of the current contents.  Blocks from the
+            base that don't overlap any change are reused, with their
+            payloads shared rather than copied.
+        '''
+        spans = self._affected_spans()
+        out = self._new_uf2()
+
+        unchanged = self._unchanged_blocks(spans)
+        regenerated = self._regenerated_blocks(spans, out)
+        for blk in heapq.merge(unchanged, regenerated, key=lambda b: b.header.address):
+            out.append_datablock(blk)
+
+        return out
+
+    def _overlapping(self, start:int, end:int):
+        '''
+            (first, last) range of overlay entries overlapping [start, end)
+        '''
+        return (bisect.bisect_right(self._ends, start),
+                bisect.bisect_left(self._starts, end))
+
+    def _overlay(self, start:int, end:int, data):
+        first, last = self._overlapping(start, end)
+        starts = [start]
+        ends = [end]
+        datas = [data]
+        if first < last:
+            # trim whatever sticks out on either side of the new range
+            head_start = self._starts[first]
+            if head_start < start:
+                head = self._data[first]
+                starts.insert(0, head_start)
+                ends.insert(0, start)
+                datas.insert(0, None if head is None else head[:start - head_start])
+
+            tail_start = self._starts[last - 1]
+            tail_end = self._ends[last - 1]
+            if tail_end > end:
+                tail = self._data[last - 1]
+                starts.append(end)
+                ends.append(tail_end)
+                datas.append(None if tail is None else tail[end - tail_start:])
+
+        self._starts[first:last] = starts
+        self._ends[first:last] = ends
+        self._data[first:last] = datas
+
+    def _base_end(self):
+        if self.uf2 is None or not len(self.uf2):
+            return 0
+        idx = self.uf2.address_index
+        return max(idx.ends)
+
+    def _covered(self, start:int, end:int) -> list:
+        # base coverage first...
+        covered = []
+        if self.uf2 is not None:
+            uf2 = self.uf2
+            for idx in uf2.address_index.overlapping(start, end):
+                hdr = uf2[idx].header
+                s = max(start, hdr.address)
+                e = min(end, hdr.address + len(uf2[idx].payload))
+                if len(covered) and s <= covered[-1][1]:
+                    covered[-1][1] = max(covered[-1][1], e)
+                else:
+                    covered.append([s, e])
+
+        # ...then apply the overlay, in address order
+        for i in range(*self._overlapping(start, end)):
+            s = max(start, self._starts[i])
+            e = min(end, self._ends[i])
+            trimmed = []
+            for cs, ce in covered:
+                if ce <= s or cs >= e:
+                    trimmed.append([cs, ce])
+                    continue
+                if cs < s:
+                    trimmed.append([cs, s])
+                if ce > e:
+                    trimmed.append([e, ce])
+            if self._data[i] is not None:
+                trimmed.append([s, e])
+                trimmed.sort()
+            covered = trimmed
+
+        merged = []
+        for s, e in covered:
+            if len(merged) and s <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+            else:
+                merged.append((s, e))
+        return merged
+
+    def _affected_spans(self) -> list:
+        '''
+            Address spans that need re-blocking: each change, widened to
+            cover any base blocks it touches.
+        '''
+        spans = []
+        for i in range(len(self._starts)):
+            start = self._starts[i]
+            end = self._ends[i]
+            if self.uf2 is not None:
+                for idx in self.uf2.address_index.overlapping(start, end):
+                    hdr = self.uf2[idx].header
+                    start = min(start, hdr.address)
+                    end = max(end, hdr.address + hdr.payload_size)
+            if len(spans) and start <= spans[-1][1]:
+                spans[-1] = (min(spans[-1][0], start), max(spans[-1][1], end))
+            else:
+                spans.append((start, end))
+        return spans
+
+    def _unchanged_blocks(self, spans:list):
+        if self.uf2 is None:
+            return
+        span_starts = [s for s, _e in spans]
+        uf2 = self.uf2
+        for idx in uf2.address_index.order:
+            blk = uf2[idx]
+            hdr = blk.header
+            pos = bisect.bisect_right(span_starts, hdr.address) - 1
+            if pos >= 0 and spans[pos][1] > hdr.address:
+                continue
+            if pos + 1 < len(spans) and spans[pos + 1][0] < hdr.address + hdr.payload_size:
+                continue
+            # share the payload, but the header will be renumbered
+            yield blk.copy()
+
+    def _regenerated_blocks(self, spans:list, out:UF2File):
+        bps = self.block_payload_size
+        for span_start, span_end in spans:
+            proto = self._prototype_header(span_start, span_end, out)
+            for start, end in self._covered(span_start, span_end):
+                # keep blocks aligned on block size boundaries
+                address = start
+                while address < end:
+                    block_end = min(end, (address // bps + 1) * bps)
+                    payload = bytes(self.read(address, block_end - address))
+                    # checksums and tags of the original blocks don't carry over
+                    flags = proto.flags & ~(Flags.MD5ChecksumPresent | Flags.ExtensionTagsPresent)
+                    hdr = Header(flags, address, len(payload), 0, 0, proto.board_family)
+                    yield DataBlock(payload, hdr, magic_start1=out.magic_start1,
+                                    magic_end=out.magic_end)
+                    address = block_end
+
+    def _prototype_header(self, start:int, end:int, out:UF2File) -> Header:
+        if self.uf2 is not None:
+            touched = self.uf2.address_index.overlapping(start, end)
+            if len(touched):
+                return self.uf2[touched[0]].header
+        return out.header
+
+    def _new_uf2(self) -> UF2File:
+        if self.uf2 is None:
+            return UF2File()
+        out = UF2File(board_family=self.uf2.header.board_family,
+                      magic_start=self.uf2.magic_start1,
+                      magic_end=self.uf2.magic_end)
+        out.header.flags = self.uf2.header.flags
+        out.header.address = self.uf2.header.address
+        return out
+
+    def __repr__(self):
+        return f'<FlashImage {self.num_changes} changes over {self.uf2}>'
@@ -31,20 +31,28 @@ class UF2EncodeError(Exception):
 
 
 class Header:
+    # plenty of these around, no need for a dict in each
+    __slots__ = ('flags', 'address', 'payload_size', 'block_number', 
+                 'total_blocks', 'board_family')
     
     @classmethod 
-    def fromBlock(cls, data: bytes):
+    def fromBlock(cls, data: bytes, magic:Magic=None):
         '''
             Construct and return a UF2 header from raw data bytes
+            
+            @param magic: the expected magic values, defaults to the standard ones
         '''
         if len(data) != BlockSize:
             raise UF2DecodeError(f"Invalid UF2 block size. Block size must be exactly {BlockSize} bytes.")
         
-        if struct.unpack_from("<I", data, 0)[0] != Magic.START0:
-            UF2DecodeError(f"Invalid START0 magic value: expected 0x{Magic.START0:08x}")
+        start0, start1 = struct.unpack_from("<II", data, 0)
+        expected_start0 = Magic.START0 if magic is None else magic.start0
+        expected_start1 = Magic.START1 if magic is None else magic.start1
+        if start0 != expected_start0:
+            raise UF2DecodeError(f"Invalid START0 magic value: expected 0x{expected_start0:08x}")
         
-        if struct.unpack_from("<I", data, 4)[0] != Magic.START1:
-            UF2DecodeError(f"Invalid START1 magic value: expected 0x{Magic.START1:08x}")
+        if start1 != expected_start1:
+            raise UF2DecodeError(f"Invalid START1 magic value: expected 0x{expected_start1:08x}")
         
         return cls(*struct.unpack_from("<IIIIII", data, 8))
     
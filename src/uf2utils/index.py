@@ -0,0 +1,193 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+Compact, columnar views of UF2 block headers.
+
+Rather than one Header object per block, the HeaderIndex holds one
+typed array per header field, so statistics over an entire image
+(address span, flags, families...) can be had without ever building
+block objects.
+
+The AddressIndex keeps blocks sorted by address, for quick lookups
+of the block(s) covering any given address range.
+'''
+import bisect
+import struct
+import sys
+from array import array
+from uf2utils.constants import BlockSize, Flags
+from uf2utils.header import Header, UF2DecodeError
+
+# typecode for unsigned 32 bit values
+U32 = 'I' if array('I').itemsize == 4 else 'L'
+
+# header word positions within a block, as 32 bit words
+WordsPerBlock = BlockSize // 4
+FieldWords = {
+    'flags': 2,
+    'address': 3,
+    'payload_size': 4,
+    'block_number': 5,
+    'total_blocks': 6,
+    'board_family': 7,
+}
+
+
+class HeaderIndex:
+    '''
+        All the headers of a UF2 image, as one array per field:
+
+            idx = HeaderIndex.fromBuffer(raw_bytes)
+            print(hex(min(idx.address)), sum(idx.payload_size))
+
+        Individual Header objects may be had through header(i).
+    '''
+    Fields = ('flags', 'address', 'payload_size',
+              'block_number', 'total_blocks', 'board_family')
+
+    @classmethod
+    def fromBuffer(cls, data):
+        '''
+            Decode all headers from raw UF2 data (bytes, bytearray,
+            mmap or memoryview), in one go.
+        '''
+        view = memoryview(data).cast('B')
+        if len(view) % BlockSize:
+            raise UF2DecodeError(f"Invalid UF2 data size. Must be a multiple of {BlockSize} bytes.")
+
+        if sys.byteorder == 'little' and len(view):
+            # view the whole thing as 32 bit words and take a strided
+            # slice per field -- no python level loop involved
+            words = view.cast(U32)
+            return cls(*[array(U32, words[FieldWords[f]::WordsPerBlock]) for f in cls.Fields])
+
+        columns = [array(U32) for _f in cls.Fields]
+        for vals in struct.iter_unpack('<8x6I476x4x', view):
+            for col, v in zip(columns, vals):
+                col.append(v)
+        return cls(*columns)
+
+    @classmethod
+    def fromBlocks(cls, blocks):
+        '''
+            Build an index from a sequence of DataBlocks
+        '''
+        columns = [array(U32) for _f in cls.Fields]
+        for blk in blocks:
+            hdr = blk.header
+            for col, f in zip(columns, cls.Fields):
+                col.append(getattr(hdr, f))
+        return cls(*columns)
+
+    def __init__(self, flags:array, address:array, payload_size:array,
+                 block_number:array, total_blocks:array, board_family:array):
+        self.flags = flags
+        self.address = address
+        self.payload_size = payload_size
+        self.block_number = block_number
+        self.total_blocks = total_blocks
+        self.board_family = board_family
+
+    def header(self, idx:int) -> Header:
+        '''
+            Construct a Header for block idx
+        '''
+        return Header(*[getattr(self, f)[idx] for f in self.Fields])
+
+    @property
+    def family(self) -> array:
+        return self.board_family
+
+    def family_records(self) -> dict:
+        '''
+            Block indices for each board family id, with families in
+            order of first appearance.  Blocks without 
+            Flags.FamilyIDPresent, whose family field means something 
+            else (file size, for file containers) or nothing, are 
+            grouped under None.
+        '''
+        records = dict()
+        for i, fam in enumerate(self.board_family):
+            if not self.flags[i] & Flags.FamilyIDPresent:
+                fam = None
+            if fam not in records:
+                records[fam] = array('L')
+            records[fam].append(i)
+        return records
+
+    def __len__(self):
+        return len(self.address)
+
+    def __repr__(self):
+        return f'<HeaderIndex {len(self)} blocks>'
+
+
+class AddressIndex:
+    '''
+        Blocks, sorted by address, for O(log n) lookups.
+        
+        Positions returned are indices into the original (unsorted) 
+        block sequence.
+    '''
+    
+    @classmethod 
+    def fromHeaderIndex(cls, hdrs:HeaderIndex):
+        return cls(hdrs.address, hdrs.payload_size)
+    
+    def __init__(self, addresses, sizes):
+        '''
+            @param addresses: block start addresses, in block order
+            @param sizes: block payload sizes, in block order
+        '''
+        # sorted() is stable, so duplicates stay in block order
+        order = sorted(range(len(addresses)), key=addresses.__getitem__)
+        self.order = array('L', order)
+        self.starts = array('Q', [addresses[i] for i in order])
+        self.ends = array('Q', [addresses[i] + sizes[i] for i in order])
+        
+        # running max of ends, so overlapping blocks are still found
+        self._reach = array('Q', self.ends)
+        for i in range(1, len(self._reach)):
+            if self._reach[i] < self._reach[i - 1]:
+                self._reach[i] = self._reach[i - 1]
+        
+    def find(self, address:int) -> int:
+        '''
+            Index of the (last, by address) block covering address, or None.
+        '''
+        pos = bisect.bisect_right(self.starts, address) - 1
+        while pos >= 0 and self._reach[pos] > address:
+            if self.ends[pos] > address:
+                return self.order[pos]
+            pos -= 1
+        return None
+    
+    def overlapping(self, start:int, end:int) -> list:
+        '''
+            Indices of all blocks with some payload in [start, end), 
+            in address order.
+        '''
+        last = bisect.bisect_left(self.starts, end)
+        first = bisect.bisect_right(self.starts, start) 
+        # walk back to any earlier blocks that reach into range
+        while first > 0 and self._reach[first - 1] > start:
+            first -= 1
+        return [self.order[i] for i in range(first, last) if self.ends[i] > start]
+    
+    def starting_in(self, start:int, end:int=None) -> list:
+        '''
+            Indices of all blocks whose start address is in [start, end), 
+            in address order.
+        '''
+        first = bisect.bisect_left(self.starts, start)
+        last = len(self.starts) if end is None else bisect.bisect_left(self.starts, end)
+        return self.order[first:last].tolist()
+    
+    def __len__(self):
+        return len(self.order)
+    
+    def __repr__(self):
+        return f'<AddressIndex {len(self)} blocks>'
@@ -0,0 +1,269 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+Combining several images (UF2 files and/or raw binaries) into one UF2.
+
+Each input is walked in address order (through its address index, so
+nothing gets re-sorted) and all of them are merged with a k-way heap
+merge.  Board families are kept apart, each one's blocks being a
+separate image in the output.  Where inputs overlap, within a family,
+the policy decides what happens:
+
+    * OverlapPolicy.Error: raise a UF2MergeError (the default)
+    * OverlapPolicy.FirstWins: the input added first keeps its bytes
+    * OverlapPolicy.LastWins: the input added last keeps its bytes
+
+    merger = UF2Merger(policy=OverlapPolicy.LastWins)
+    merger.add_uf2(UF2File('/tmp/bootloader.uf2'))
+    merger.add_uf2('/tmp/application.uf2')
+    merger.add_binary('/tmp/fs.bin', 0x100a0000)
+    merger.merge().to_file('/tmp/combined.uf2')
+    for start, end, names in merger.overlaps:
+        print(f'{hex(start)} - {hex(end)} in {names}')
+
+'''
+import heapq
+from uf2utils.constants import DefaultBlockPayloadSize, Flags
+from uf2utils.header import Header, UF2EncodeError
+from uf2utils.block import DataBlock
+from uf2utils.file import UF2File
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class UF2MergeError(UF2EncodeError):
+    pass
+
+
+class OverlapPolicy:
+    Error = 'error'
+    FirstWins = 'first'
+    LastWins = 'last'
+
+    All = (Error, FirstWins, LastWins)
+
+
+# family of pieces without Flags.FamilyIDPresent, ordered before any real one
+NoFamily = -1
+
+
+class _Piece:
+    '''
+        An address range from one input, ordered by 
+        (family, start, rank, seq) in the heap merge.
+    '''
+    __slots__ = ('family', 'start', 'end', 'rank', 'seq', 'block')
+    def __init__(self, start:int, end:int, rank:int, seq:int, block:DataBlock):
+        # as for UF2File.family_index, the field only counts when flagged
+        hdr = block.header
+        self.family = hdr.board_family if hdr.flags & Flags.FamilyIDPresent else NoFamily
+        self.start = start
+        self.end = end
+        self.rank = rank
+        self.seq = seq
+        self.block = block
+
+    def __lt__(self, other):
+        return (self.family, self.start, self.rank, self.seq) < \
+                    (other.family, other.start, other.rank, other.seq)
+
+
+class UF2Merger:
+    '''
+        Collects inputs, then merges them into a single UF2File.
+    '''
+    def __init__(self, policy:str=OverlapPolicy.Error, board_family:int=None,
+                 block_payload_size:int=DefaultBlockPayloadSize):
+        '''
+            @param policy: one of OverlapPolicy.All
+            @param board_family: family for blocks generated from raw binaries,
+            defaults to that of the first UF2 input
+            @param block_payload_size: payload size of blocks generated from
+            raw binaries
+        '''
+        if policy not in OverlapPolicy.All:
+            raise ValueError(f'Unknown overlap policy {policy}')
+        self.policy = policy
+        self.board_family = board_family
+        self.block_payload_size = block_payload_size
+        # (start, end, (name, name...)) of every overlap found by merge()
+        self.overlaps = []
+        self._inputs = []
+        # UF2Files and paths of binaries, whose mappings payloads may share
+        self._mapped_sources = []
+
+    def add_uf2(self, uf2, name:str=None):
+        '''
+            @param uf2: a UF2File, or path to one
+        '''
+        if isinstance(uf2, str):
+            name = name or uf2
+            uf2 = UF2File(uf2, lazy=True, use_mmap=True)
+        if self.board_family is None and len(uf2):
+            self.board_family = uf2.header.board_family
+        self._mapped_sources.append(uf2)
+        self._inputs.append((name or f'uf2 #{len(self._inputs)}', uf2, None))
+
+    def add_binary(self, data, base_address:int, name:str=None):
+        '''
+            @param data: bytes-like, or path to a raw binary file
+            @param base_address: flash address of data's first byte
+        '''
+        if isinstance(data, str):
+            name = name or data
+            self._mapped_sources.append(data)
+            data = UF2File.readRaw(data, use_mmap=True)
+        self._inputs.append((name or f'binary #{len(self._inputs)}',
+                             memoryview(data), base_address))
+
+    @property
+    def num_inputs(self):
+        return len(self._inputs)
+
+    def merge(self) -> UF2File:
+        '''
+            Produce the combined UF2File.  Payloads are shared with
+            the inputs wherever blocks make it through unclipped.
+        '''
+        self.overlaps = []
+        out = UF2File(board_family=self.board_family)
+        if self.board_family is None:
+            self.board_family = out.header.board_family
+        for source in self._mapped_sources:
+            out.add_mapped_source(source)
+
+        streams = []
+        for rank, (_name, source, base_address) in enumerate(self._inputs):
+            if base_address is None:
+                streams.append(self._uf2_pieces(rank, source))
+            else:
+                streams.append(self._binary_pieces(rank, source, base_address))
+
+        for blk in self._resolve(heapq.merge(*streams)):
+            out.append_datablock(blk)
+
+        if len(self.overlaps):
+            log.warning(f'Merged with {len(self.overlaps)} overlapping ranges')
+        return out
+
+    def _uf2_pieces(self, rank:int, uf2:UF2File):
+        if len(uf2.families) > 1:
+            # each family sorted on its own, for the (family, address) order
+            yield from heapq.merge(*[self._uf2_pieces(rank, uf2.for_family(fam)) 
+                                        for fam in uf2.families])
+            return
+        
+        idx = uf2.address_index
+        for seq in range(len(idx)):
+            if idx.starts[seq] == idx.ends[seq]:
+                continue
+            yield _Piece(idx.starts[seq], idx.ends[seq], rank, seq, uf2[idx.order[seq]])
+
+    def _binary_pieces(self, rank:int, data:memoryview, base_address:int):
+        bps = self.block_payload_size
+        flags = Flags.FamilyIDPresent if self.board_family else 0
+        offset = 0
+        seq = 0
+        while offset < len(data):
+            # keep blocks aligned on block size boundaries
+            address = base_address + offset
+            size = min(len(data) - offset, (address // bps + 1) * bps - address)
+            hdr = Header(flags, address, size, 0, 0, self.board_family or 0)
+            yield _Piece(address, address + size, rank, seq,
+                         DataBlock(data[offset:offset + size], hdr))
+            offset += size
+            seq += 1
+
+    def _resolve(self, pieces):
+        '''
+            Group pieces into clusters of mutually overlapping ranges,
+            passing lone pieces straight through.
+        '''
+        cluster = []
+        cluster_end = 0
+        for piece in pieces:
+            if len(cluster) and (piece.start >= cluster_end or piece.family != cluster[0].family):
+                yield from self._resolve_cluster(cluster)
+                cluster = []
+            if not len(cluster):
+                cluster_end = piece.end
+            cluster.append(piece)
+            cluster_end = max(cluster_end, piece.end)
+
+        if len(cluster):
+            yield from self._resolve_cluster(cluster)
+
+    def _resolve_cluster(self, cluster:list):
+        if len(cluster) == 1:
+            yield self._output_block(cluster[0], cluster[0].start, cluster[0].end)
+            return
+
+        bounds = sorted(set([p.start for p in cluster] + [p.end for p in cluster]))
+        if self.policy == OverlapPolicy.LastWins:
+            pick = lambda cands: max(cands, key=lambda p: (p.rank, p.seq))
+        else:
+            pick = lambda cands: min(cands, key=lambda p: (p.rank, p.seq))
+
+        current = None
+        current_start = 0
+        current_end = 0
+        for seg_start, seg_end in zip(bounds, bounds[1:]):
+            cands = [p for p in cluster if p.start <= seg_start and p.end >= seg_end]
+            if len(cands) > 1:
+                self._record_overlap(seg_start, seg_end, cands)
+            winner = pick(cands) if len(cands) else None
+            if winner is current and seg_start == current_end:
+                current_end = seg_end
+                continue
+            if current is not None:
+                yield self._output_block(current, current_start, current_end)
+            current = winner
+            current_start = seg_start
+            current_end = seg_end
+
+        if current is not None:
+            yield self._output_block(current, current_start, current_end)
+
+    def _record_overlap(self, start:int, end:int, cands:list):
+        names = tuple(dict.fromkeys(self._inputs[p.rank][0] for p in sorted(cands, key=lambda p: p.rank)))
+        if len(self.overlaps) and self.overlaps[-1][1] == start and self.overlaps[-1][2] == names:
+            self.overlaps[-1] = (self.overlaps[-1][0], end, names)
+        else:
+            self.overlaps.append((start, end, names))
+
+        if self.policy == OverlapPolicy.Error:
+            raise UF2MergeError(f'Overlap @ {hex(start)} - {hex(end)} between {", ".join(names)}')
+
+    def _output_block(self, piece:_Piece, start:int, end:int) -> DataBlock:
+        blk = piece.block.copy()
+        if start != piece.start or end != piece.end:
+            blk.payload = memoryview(blk.payload)[start - piece.start:end - piece.start]
+            blk.header.address = start
+            blk.header.payload_size = end - start
+            # whatever the checksum covered, it wasn't this
+            blk.header.flags &= ~Flags.MD5ChecksumPresent
+            blk.md5 = None
+        return blk
+
+    def __repr__(self):
+        return f'<UF2Merger {self.num_inputs} inputs ({self.policy})>'
+
+
+def merge(uf2s:list, binaries:list=None, policy:str=OverlapPolicy.Error, **kwargs) -> UF2File:
+    '''
+        Convenience wrapper around UF2Merger.
+
+        @param uf2s: UF2Files or paths to them
+        @param binaries: (data or path, base_address) pairs
+        @param policy: one of OverlapPolicy.All
+    '''
+    merger = UF2Merger(policy, **kwargs)
+    for uf2 in uf2s:
+        merger.add_uf2(uf2)
+    for data, base_address in (binaries or []):
+        merger.add_binary(data, base_address)
+    return merger.merge()
@@ -0,0 +1,150 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+Per-device UF2 generation from a common base.
+
+The base is parsed and encoded once, into a template.  Each variant is
+then a copy of that template with only the payload bytes of blocks
+overlapping the patched addresses rewritten.  Blocks whose MD5 checksum
+covers a patched address lose it (flag and trailer), as it no longer
+holds.
+
+    tmpl = UF2Template(UF2File('/tmp/base.uf2'))
+    tmpl.write('/tmp/unit-0001.uf2', {0x100ff000: b'SN0001'})
+
+    variants = ((f'/tmp/unit-{i:04}.uf2', {0x100ff000: f'SN{i:04}'.encode()})
+                    for i in range(10000))
+    for path in tmpl.write_batch(variants, max_workers=8):
+        print(f'Wrote {path}')
+
+'''
+import concurrent.futures
+import struct
+from uf2utils.constants import BlockSize, Flags
+from uf2utils.header import UF2EncodeError
+from uf2utils.block import MD5Trailer, MD5TrailerOffset, unpack_md5
+from uf2utils.index import HeaderIndex, AddressIndex
+from uf2utils.file import UF2File
+
+# payload offset within a block
+PayloadOffset = 32
+# flags field, within a block
+FlagsField = struct.Struct('<I')
+FlagsOffset = 8
+
+class UF2Template:
+    '''
+        A pre-encoded UF2 image, into which patches are applied.
+
+        Patches are a mapping (or sequence of pairs) of
+        address: bytes, and may only touch addresses already
+        present in the image.
+    '''
+    def __init__(self, uf2:UF2File):
+        uf2.finalize()
+        self.template = bytes(uf2.encode())
+        # index what was actually encoded (gap padding included)
+        self.headers = HeaderIndex.fromBuffer(self.template)
+        self.address_index = AddressIndex.fromHeaderIndex(self.headers)
+        # checksummed blocks, indexed by the region their checksum covers
+        self._checksummed = [record for record in range(len(self.headers))
+                                if self.headers.flags[record] & Flags.MD5ChecksumPresent]
+        regions = [unpack_md5(self.template, record * BlockSize) for record in self._checksummed]
+        self._checksum_index = AddressIndex([r[0] for r in regions], [r[1] for r in regions])
+
+    @property
+    def num_blocks(self):
+        return len(self.template) // BlockSize
+
+    def render(self, patches) -> bytearray:
+        '''
+            Produce the encoded UF2 for a variant.
+
+            @param patches: dict or iterable of (address, bytes)
+            @return: bytearray of the complete UF2
+        '''
+        out = bytearray(self.template)
+        self.apply(out, patches)
+        return out
+
+    def apply(self, target, patches):
+        '''
+            Apply patches to an encoded copy of the template.
+        '''
+        if hasattr(patches, 'items'):
+            patches = patches.items()
+
+        addresses = self.headers.address
+        sizes = self.headers.payload_size
+        for address, data in patches:
+            end = address + len(data)
+            covered = 0
+            for record in self.address_index.overlapping(address, end):
+                blk_start = addresses[record]
+                blk_end = blk_start + sizes[record]
+                src_from = max(address, blk_start)
+                src_to = min(end, blk_end)
+                dest = record * BlockSize + PayloadOffset + src_from - blk_start
+                target[dest:dest + src_to - src_from] = data[src_from - address:src_to - address]
+                covered += src_to - src_from
+
+            if covered < len(data):
+                raise UF2EncodeError(f'Patch @ {hex(address)} ({len(data)} bytes) extends outside of image')
+
+            for pos in self._checksum_index.overlapping(address, end):
+                self._drop_checksum(target, self._checksummed[pos])
+
+    def _drop_checksum(self, target, record:int):
+        offset = record * BlockSize
+        flags = FlagsField.unpack_from(target, offset + FlagsOffset)[0]
+        FlagsField.pack_into(target, offset + FlagsOffset, flags & ~Flags.MD5ChecksumPresent)
+        start = offset + MD5TrailerOffset
+        target[start:start + MD5Trailer.size] = bytes(MD5Trailer.size)
+
+    def write(self, file_path:str, patches):
+        '''
+            Write out a variant with patches applied.
+        '''
+        with open(file_path, 'wb') as f:
+            f.write(self.render(patches))
+        return file_path
+
+    def write_batch(self, variants, max_workers:int=None, use_processes:bool=True):
+        '''
+            Write many variants in parallel.
+
+            @param variants: iterable of (file_path, patches)
+            @param max_workers: pool size (defaults to executor's default)
+            @param use_processes: use a process pool (default) or threads
+            @return: generator of the file paths, in completion order
+        '''
+        if use_processes:
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers,
+                                                          initializer=_set_worker_template,
+                                                          initargs=(self,))
+            job = _write_variant
+        else:
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+            job = self.write
+
+        with pool:
+            futures = [pool.submit(job, path, patches) for path, patches in variants]
+            for fut in concurrent.futures.as_completed(futures):
+                yield fut.result()
+
+    def __repr__(self):
+        return f'<UF2Template {self.num_blocks} blocks>'
+
+
+# template in pool worker processes, sent over once per worker
+_WorkerTemplate = None
+
+def _set_worker_template(template:UF2Template):
+    global _WorkerTemplate
+    _WorkerTemplate = template
+
+def _write_variant(file_path:str, patches):
+    return _WorkerTemplate.write(file_path, patches)
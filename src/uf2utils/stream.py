@@ -0,0 +1,270 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+Streaming UF2 input and output, for when holding the whole image (or 
+all its blocks) in memory is not an option.
+
+    with open('/tmp/in.uf2', 'rb') as f:
+        for blk in iter_blocks(f):
+            print(blk.header.address)
+
+    hdr = Header(Flags.FamilyIDPresent, 0, 0, 0, 0, Family.byName('RP2040').id)
+    with UF2StreamWriter('/tmp/out.uf2', hdr) as writer:
+        with open('/tmp/big.bin', 'rb') as src:
+            writer.write_payload(src, 0x10000000)
+        writer.write_payload(some_generator_of_chunks(), 0x10400000)
+
+'''
+import struct
+from uf2utils.constants import BlockSize, DefaultBlockPayloadSize, MaxPayloadSize, Magic, Flags
+from uf2utils.header import Header, UF2EncodeError, UF2DecodeError
+from uf2utils.block import DataBlock, pack_block
+
+TotalBlocksStruct = struct.Struct('<I')
+TotalBlocksOffset = 24
+
+# how many blocks are encoded before hitting the output
+StreamBatchBlocks = 64
+
+# default size of reads from input streams
+StreamReadSize = 128 * BlockSize
+
+
+def iter_chunks(source, chunk_size:int):
+    '''
+        Yield the contents of source as successive chunks of
+        chunk_size bytes (the last one may be shorter).
+
+        source may be a bytes-like object, a binary file-like
+        object or any iterable of bytes-like chunks, of any size.
+    '''
+    if hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            if len(chunk) == chunk_size:
+                yield chunk
+            else:
+                # short read, make sure we actually hit the end
+                pending = bytearray(chunk)
+                while len(pending) < chunk_size:
+                    more = source.read(chunk_size - len(pending))
+                    if not more:
+                        break
+                    pending += more
+                yield pending
+                if len(pending) < chunk_size:
+                    return
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        # slices of memoryviews are zero-copy, others are copies
+        for i in range(0, len(source), chunk_size):
+            yield source[i:i + chunk_size]
+        return
+
+    pending = bytearray()
+    for chunk in source:
+        pending += chunk
+        if len(pending) < chunk_size:
+            continue
+        view = memoryview(pending)
+        num_full = len(pending) - (len(pending) % chunk_size)
+        for i in range(0, num_full, chunk_size):
+            yield bytes(view[i:i + chunk_size])
+        view.release()
+        del pending[:num_full]
+
+    if len(pending):
+        yield pending
+
+
+def iter_records(source, read_size:int=StreamReadSize):
+    '''
+        Yield the raw 512 byte records from a binary stream, as they arrive.
+        
+        source may be anything with a read() (files, pipes, sys.stdin.buffer, 
+        socket.makefile(), HTTP responses...) or a socket's recv().  Data is 
+        pulled in read_size chunks and the records are memoryview slices of 
+        those (immutable) chunks.
+        
+        @raise UF2DecodeError: if the stream ends mid-record
+    '''
+    read = source.read if hasattr(source, 'read') else source.recv
+    leftover = b''
+    while True:
+        chunk = read(read_size)
+        if not chunk:
+            break
+        if len(leftover):
+            chunk = leftover + chunk
+        
+        num_full = len(chunk) - (len(chunk) % BlockSize)
+        view = memoryview(chunk)
+        for i in range(0, num_full, BlockSize):
+            yield view[i:i + BlockSize]
+        leftover = bytes(view[num_full:])
+    
+    if len(leftover):
+        raise UF2DecodeError(f'Stream ended with a partial block of {len(leftover)} bytes')
+
+
+def iter_blocks(source, read_size:int=StreamReadSize, magic:Magic=None):
+    '''
+        Generator of DataBlocks decoded from a binary stream, one at a time
+        as the data comes in.
+        
+        @param magic: the stream's magic values, if not the standard ones
+        @see: iter_records() for the types of source supported
+    '''
+    for record in iter_records(source, read_size):
+        yield DataBlock.fromBlock(record, magic=magic)
+
+
+class UF2StreamWriter:
+    '''
+        Writes UF2 blocks straight to the output as payload comes in,
+        so memory use stays constant no matter the size of the image.
+
+        If total_blocks is not known up front, the output must be
+        seekable: the block total is patched into every written
+        block on close().
+    '''
+    def __init__(self, output, header:Header, total_blocks:int=None,
+                 magic_start1:int=None, magic_end:int=None, magic:Magic=None):
+        '''
+            @param output: path to, or writable binary file object for, the output
+            @param header: prototype header (flags and board family are used)
+            @param total_blocks: number of blocks that will be written, if known
+            @param magic_start1: optional override of the START1 magic
+            @param magic_end: optional override of the END magic
+            @param magic: alternatively, the Magic to use (e.g. a UF2File's)
+        '''
+        if isinstance(output, str):
+            self._out = open(output, 'wb')
+            self._owns_output = True
+        else:
+            self._out = output
+            self._owns_output = False
+
+        if total_blocks is None and not self._out.seekable():
+            raise UF2EncodeError('Output must be seekable when total_blocks is unknown')
+
+        self.header = header
+        self.total_blocks = total_blocks
+        if magic is None:
+            magic = Magic(magic_start1, magic_end)
+        self.magic_start1 = magic.start1
+        self.magic_end = magic.end
+        self._start_pos = self._out.tell() if self._out.seekable() else 0
+        self._num_blocks = 0
+        self._batch = bytearray(StreamBatchBlocks * BlockSize)
+        self._batch_count = 0
+        self._closed = False
+
+    @property
+    def num_blocks(self):
+        return self._num_blocks
+
+    def write_payload(self, source, start_offset:int,
+                      block_payload_size:int=DefaultBlockPayloadSize) -> int:
+        '''
+            Write arbitrary payload, in blocks of block_payload_size,
+            starting at address start_offset.
+
+            @param source: bytes-like, binary file object or iterable of chunks
+            @return: number of payload bytes written
+        '''
+        if block_payload_size <= 0 or block_payload_size > MaxPayloadSize:
+            raise UF2EncodeError(f'Block payload size must be between 1 and {MaxPayloadSize}')
+
+        address = start_offset
+        for chunk in iter_chunks(source, block_payload_size):
+            self.write_block(address, chunk)
+            address += len(chunk)
+
+        return address - start_offset
+
+    def write_datablock(self, dblock):
+        '''
+            Write an existing DataBlock (only its address, flags and
+            family are used, numbering is handled here).
+        '''
+        md5 = dblock.md5 if dblock.header.flags & Flags.MD5ChecksumPresent else None
+        file_name = dblock.file_name if dblock.header.flags & Flags.FileContainer else None
+        self.write_block(dblock.header.address, dblock.payload,
+                         dblock.header.flags, dblock.header.board_family, md5,
+                         dblock.encoded_tags(), file_name)
+
+    def write_block(self, address:int, payload, flags:int=None, board_family:int=None,
+                    md5:tuple=None, tags:bytes=None, file_name:bytes=None):
+        '''
+            Encode and queue a single block for output.
+            
+            @param md5: optional (address, length, digest) checksum trailer
+            @param tags: optional encoded extension tags (see tags.encode_tags)
+            @param file_name: optional name, for file container blocks
+        '''
+        if self._closed:
+            raise UF2EncodeError('Writer is closed')
+
+        if flags is None:
+            flags = self.header.flags
+        if board_family is None:
+            board_family = self.header.board_family
+
+        pack_block(self._batch, self._batch_count * BlockSize,
+                   flags, address, payload,
+                   self._num_blocks, self.total_blocks or 0,
+                   board_family, self.magic_start1, self.magic_end, md5, tags, file_name)
+
+        self._num_blocks += 1
+        self._batch_count += 1
+        if self._batch_count == StreamBatchBlocks:
+            self.flush()
+
+    def flush(self):
+        if self._batch_count:
+            self._out.write(memoryview(self._batch)[:self._batch_count * BlockSize])
+            self._batch_count = 0
+        self._out.flush()
+
+    def close(self):
+        '''
+            Flush everything out and, if required, patch the
+            block total in all the blocks written.
+        '''
+        if self._closed:
+            return
+        self.flush()
+        if self.total_blocks != self._num_blocks:
+            self._patch_totals()
+
+        self._closed = True
+        if self._owns_output:
+            self._out.close()
+
+    def _patch_totals(self):
+        if not self._out.seekable():
+            raise UF2EncodeError(f'Wrote {self._num_blocks} blocks but announced {self.total_blocks}, cannot patch stream')
+
+        end_pos = self._out.tell()
+        total = TotalBlocksStruct.pack(self._num_blocks)
+        for i in range(self._num_blocks):
+            self._out.seek(self._start_pos + i * BlockSize + TotalBlocksOffset)
+            self._out.write(total)
+        self._out.seek(end_pos)
+        self._out.flush()
+        self.total_blocks = self._num_blocks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __repr__(self):
+        return f'<UF2StreamWriter {self._num_blocks} blocks>'
@@ -0,0 +1,170 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+UF2 extension tags (Flags.ExtensionTagsPresent).
+
+Tags follow the payload, starting on the next 4 byte boundary.  Each
+is a size byte (covering the 4 byte tag header and data, but not the
+padding to the next 4 byte boundary), a 3 byte type and the data.
+A tag of size 0 ends the list.
+
+    blk.set_tag(TagType.Version, '1.2.3')
+    blk.get_tag(TagType.PageSize)   # 4096, or None
+
+Blocks hold their tags as raw bytes, by type, and get_tag()/set_tag()
+handle the conversion for the known types.
+'''
+import struct
+from uf2utils.header import UF2DecodeError, UF2EncodeError
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class TagType:
+    Version = 0x9fc7bc
+    Description = 0x650d9d
+    PageSize = 0x0be9f7
+    SHA2 = 0xb46db0
+    DeviceType = 0xc8a729
+
+    Names = {
+        Version: 'version',
+        Description: 'description',
+        PageSize: 'page size',
+        SHA2: 'sha2',
+        DeviceType: 'device type',
+    }
+
+    @classmethod
+    def name(cls, tag_type:int) -> str:
+        return cls.Names.get(tag_type, f'tag {hex(tag_type)}')
+
+
+TagHeaderSize = 4
+TagMaxSize = 0xff
+_Terminator = bytes(TagHeaderSize)
+
+# types holding text or 32 bit values, anything else is raw bytes
+_TextTags = (TagType.Version, TagType.Description)
+_IntTags = (TagType.PageSize, TagType.DeviceType)
+_U32 = struct.Struct('<I')
+
+
+def tags_start(payload_size:int) -> int:
+    '''
+        Offset of the tags, relative to the start of the data area
+    '''
+    return (payload_size + 3) & ~3
+
+
+def parse_tags(data, offset:int, end:int) -> list:
+    '''
+        Decode the tags in data[offset:end].
+
+        @return: list of (tag type, raw value) tuples, values being
+        slices of data (so views, if data is a memoryview)
+    '''
+    tags = []
+    while offset + TagHeaderSize <= end:
+        size = data[offset]
+        if size == 0:
+            break
+        if size < TagHeaderSize or offset + size > end:
+            raise UF2DecodeError(f'Invalid extension tag of size {size} @ {offset}')
+        tag_type = data[offset + 1] | (data[offset + 2] << 8) | (data[offset + 3] << 16)
+        tags.append((tag_type, data[offset + TagHeaderSize:offset + size]))
+        offset += (size + 3) & ~3
+    return tags
+
+
+def encode_tags(tags) -> bytes:
+    '''
+        Encode tags, a dict or iterable of (tag type, raw bytes), including
+        the terminating empty tag.
+    '''
+    if hasattr(tags, 'items'):
+        tags = tags.items()
+    encoded = bytearray()
+    for tag_type, value in tags:
+        size = TagHeaderSize + len(value)
+        if size > TagMaxSize:
+            raise UF2EncodeError(f'{TagType.name(tag_type)} tag too large ({len(value)} bytes)')
+        encoded += bytes((size, tag_type & 0xff, (tag_type >> 8) & 0xff, (tag_type >> 16) & 0xff))
+        encoded += value
+        encoded += bytes(-len(encoded) % 4)
+    encoded += _Terminator
+    return bytes(encoded)
+
+
+def decode_tag(tag_type:int, raw):
+    '''
+        Value of a raw tag: str for text tags, int for 32 bit values,
+        bytes for anything else.
+    '''
+    if tag_type in _TextTags:
+        return bytes(raw).decode('utf-8')
+    if tag_type in _IntTags and len(raw) == _U32.size:
+        return _U32.unpack(raw)[0]
+    return bytes(raw)
+
+
+def tag_bytes(tag_type:int, value) -> bytes:
+    '''
+        Raw encoding of a tag value (inverse of decode_tag)
+    '''
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    if isinstance(value, int):
+        return _U32.pack(value)
+    return bytes(value)
+
+
+class TagIndex:
+    '''
+        Every tag in an image, by type, along with the index of the
+        block holding it.  Values are raw (see decode_tag()) and, for
+        lazy files, views straight into the file data.
+    '''
+    def __init__(self):
+        self._entries = dict()
+
+    def add(self, record:int, tag_type:int, raw):
+        self._entries.setdefault(tag_type, []).append((record, raw))
+
+    @property
+    def types(self) -> list:
+        return list(self._entries.keys())
+
+    def find(self, tag_type:int) -> list:
+        '''
+            Indices of the blocks holding a tag_type tag
+        '''
+        return [record for record, _raw in self._entries.get(tag_type, [])]
+
+    def values(self, tag_type:int) -> list:
+        '''
+            Decoded values of all tag_type tags, in block order
+        '''
+        return [decode_tag(tag_type, raw) for _record, raw in self._entries.get(tag_type, [])]
+
+    def first(self, tag_type:int):
+        '''
+            Decoded value of the first tag_type tag, or None
+        '''
+        entries = self._entries.get(tag_type)
+        if not entries:
+            return None
+        return decode_tag(tag_type, entries[0][1])
+
+    def __contains__(self, tag_type:int):
+        return tag_type in self._entries
+
+    def __len__(self):
+        return sum(len(e) for e in self._entries.values())
+
+    def __repr__(self):
+        return f'<TagIndex {len(self)} tags>'
@@ -0,0 +1,118 @@
+'''
+Created on Oct 18, 2026
+
+@author: Pat Deegan
+@copyright: Copyright (C) 2026 Pat Deegan, https://psychogenic.com
+
+Whole-image header decoding and magic validation.
+
+If NumPy is available, the raw data is viewed as a structured array of
+512 byte records and everything happens in bulk, without any python
+level loop over the blocks.  Without it, these fall back to the struct
+based decoding.
+
+    from uf2utils.vectorized import validate_file
+    bad = validate_file('/tmp/firmware.uf2')
+    if len(bad):
+        print(f'Blocks {bad} have invalid magic')
+
+'''
+import struct
+from array import array
+from uf2utils.constants import BlockSize, Magic, MaxPayloadSize
+from uf2utils.header import UF2DecodeError
+from uf2utils.index import HeaderIndex, U32
+from uf2utils.file import UF2File
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HaveNumPy = np is not None
+
+if HaveNumPy:
+    BlockRecord = np.dtype([
+        ('magic_start0', '<u4'),
+        ('magic_start1', '<u4'),
+        ('flags', '<u4'),
+        ('address', '<u4'),
+        ('payload_size', '<u4'),
+        ('block_number', '<u4'),
+        ('total_blocks', '<u4'),
+        ('board_family', '<u4'),
+        ('data', f'V{MaxPayloadSize}'),
+        ('magic_end', '<u4'),
+    ])
+else:
+    BlockRecord = None
+
+
+def as_records(data):
+    '''
+        View raw UF2 data as a NumPy structured array of block records
+        (no copy involved).  Requires NumPy.
+    '''
+    if not HaveNumPy:
+        raise RuntimeError('NumPy is required for as_records()')
+
+    if len(memoryview(data).cast('B')) % BlockSize:
+        raise UF2DecodeError(f"Invalid UF2 data size. Must be a multiple of {BlockSize} bytes.")
+    return np.frombuffer(data, dtype=BlockRecord)
+
+
+def decode_headers(data) -> HeaderIndex:
+    '''
+        Decode all the headers in raw UF2 data into a HeaderIndex.
+    '''
+    if not HaveNumPy:
+        return HeaderIndex.fromBuffer(data)
+
+    records = as_records(data)
+    columns = []
+    for field in HeaderIndex.Fields:
+        col = array(U32)
+        col.frombytes(records[field].astype(np.uint32).tobytes())
+        columns.append(col)
+    return HeaderIndex(*columns)
+
+
+def find_bad_magic(data, magic_start1:int=None, magic_end:int=None) -> list:
+    '''
+        Check the START0, START1 and END magic of every block in raw
+        UF2 data.
+
+        @param magic_start1: expected START1 (defaults to Magic.START1)
+        @param magic_end: expected END (defaults to Magic.END)
+        @return: list of indices of blocks with any invalid magic number
+    '''
+    if magic_start1 is None:
+        magic_start1 = Magic.START1
+    if magic_end is None:
+        magic_end = Magic.END
+
+    if HaveNumPy:
+        records = as_records(data)
+        bad = (records['magic_start0'] != Magic.START0) \
+                | (records['magic_start1'] != magic_start1) \
+                | (records['magic_end'] != magic_end)
+        return np.flatnonzero(bad).tolist()
+
+    view = memoryview(data).cast('B')
+    if len(view) % BlockSize:
+        raise UF2DecodeError(f"Invalid UF2 data size. Must be a multiple of {BlockSize} bytes.")
+
+    bad = []
+    expected = (Magic.START0, magic_start1, magic_end)
+    for i, magics in enumerate(struct.iter_unpack(f'<II{BlockSize - 12}xI', view)):
+        if magics != expected:
+            bad.append(i)
+    return bad
+
+
+def validate_file(filepath:str, magic_start1:int=None, magic_end:int=None) -> list:
+    '''
+        Check magic numbers of all blocks in a UF2 file,
+        returning the indices of any bad blocks.
+    '''
+    return find_bad_magic(UF2File.readRaw(filepath, use_mmap=True), magic_start1, magic_end)